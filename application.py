@@ -5,11 +5,17 @@ from logging.handlers import RotatingFileHandler
 from errors.errors import DefaultError
 from game.game_app import Main
 from game.game_observer import KafkaMapObserver, KafkaPlayerObserver
+from game.game_tick import GameTick
+from game.world_store import WorldStore
 from game.queue_wrapper import BufferQueueWithLock
 from kafka.consumer_async import AIOGameMapKafkaConsumer
 from kafka.producer_async import AIOGameMapKafkaProducer
 from repository.repository import CharacterRepository
+from repository.stats_writer import StatsWriteBehind
 from service.game_service import KafkaGameManager
+from metrics.server import MetricsServer
+from service.location_workers import LocationWorkerPool, WorkerGameManager
+from transport.factory import create_transports
 from config.settings import settings
 from db.db import db_helper
 
@@ -28,24 +34,56 @@ logger.addHandler(log_handler)
 
 
 async def main():
+    if settings.db is None or settings.transport.backend == "kafka" and settings.kafka is None:
+        raise RuntimeError("The game server needs the DB__* settings, and the KAFKA__* ones with the kafka transport")
+    if settings.game.workers > 0 and settings.game.chunked_world:
+        # Every worker would generate the same chunked world and write the same chunk files.
+        raise RuntimeError("GAME__WORKERS cannot be used with GAME__CHUNKED_WORLD")
+    if settings.transport.backend == "memory":
+        # Nothing outside the process can reach a memory transport; it is only for code that creates the game itself.
+        raise RuntimeError("TRANSPORT__BACKEND=memory cannot be used by the game server, use kafka or unix_socket")
     __GAME_TICK = settings.game.tick
     stop_event = None
     consumer_task = None
     producer_task = None
+    worker_pool = None
+    world_store = None
+    metrics_server = None
+    stats_writer = None
     try:
-        game = Main()
-        output_queue = BufferQueueWithLock()
         stop_event = asyncio.Event()
-        char_repository = CharacterRepository()
-        kafka_map_producer = AIOGameMapKafkaProducer(output_queue, game, tick=__GAME_TICK)
-        game_manager = KafkaGameManager(game, kafka_map_producer, output_queue, char_repository)
-        kafka_observer = KafkaMapObserver(output_queue)
-        player_observer = KafkaPlayerObserver(output_queue)
-        game.add_map_observer(kafka_observer)
-        game.add_player_observer(player_observer)
-        await game_manager.generate_main_location()
-        kafka_game_event_consumer = AIOGameMapKafkaConsumer(game_manager)
+        if settings.metrics.enabled:
+            metrics_server = MetricsServer(settings.metrics.host, settings.metrics.port)
+            await metrics_server.start()
+        inbound_transport, outbound_transport = create_transports()
+        if settings.game.workers > 0:
+            worker_pool = LocationWorkerPool(settings.game.workers, tick=__GAME_TICK,
+                                             char_repository=CharacterRepository())
+            await worker_pool.start()
+            kafka_map_producer = AIOGameMapKafkaProducer(worker_pool, tick=__GAME_TICK,
+                                                         transport=outbound_transport)
+            game_manager = WorkerGameManager(worker_pool)
+        else:
+            game = Main()
+            output_queue = BufferQueueWithLock()
+            char_repository = CharacterRepository()
+            stats_writer = StatsWriteBehind(char_repository, settings.db.stats_flush_interval_ms,
+                                            settings.db.stats_batch_size, settings.db.stats_max_retry_delay_ms)
+            kafka_map_producer = AIOGameMapKafkaProducer(GameTick(game, output_queue), tick=__GAME_TICK,
+                                                         transport=outbound_transport)
+            game_manager = KafkaGameManager(game, kafka_map_producer, output_queue, char_repository, stats_writer)
+            kafka_observer = KafkaMapObserver(output_queue)
+            player_observer = KafkaPlayerObserver(output_queue)
+            game.add_map_observer(kafka_observer)
+            game.add_player_observer(player_observer)
+            if settings.game.world_store_dir and not settings.game.chunked_world:
+                world_store = WorldStore(settings.game.world_store_dir, settings.game.snapshot_interval,
+                                         settings.game.world_log_fsync)
+            await game_manager.start_world(world_store)
+        kafka_game_event_consumer = AIOGameMapKafkaConsumer(game_manager, inbound_transport)
 
+        if stats_writer:
+            stats_writer.start()
         await kafka_map_producer.start()
         await kafka_game_event_consumer.start()
 
@@ -62,7 +100,6 @@ async def main():
     except asyncio.CancelledError:
         print("Tasks cancelled from main.")
     finally:
-        await db_helper.dispose()
         if stop_event:
             stop_event.set()
         if consumer_task:
@@ -70,6 +107,16 @@ async def main():
         if producer_task:
             producer_task.cancel()
         await asyncio.gather(producer_task, consumer_task, return_exceptions=True)
+        if worker_pool:
+            await worker_pool.close()
+        if stats_writer:
+            # After the producer stopped, so the changes of its last tick are saved as well.
+            await stats_writer.close()
+        await db_helper.dispose()
+        if world_store:
+            world_store.close()
+        if metrics_server:
+            await metrics_server.close()
         print("Graceful shutdown.")
 
 
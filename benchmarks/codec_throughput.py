@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+from errors.errors import CodecNotAvailableError
+from game.location_generator import generate_main_location
+from game.player import Player
+from kafka.codec import CODECS, get_codec
+
+ITERATIONS = 2_000
+
+
+async def build_payloads() -> dict[str, object]:
+    location = await generate_main_location()
+    world = location.get_map()
+    player = Player("user_id", "name")
+    await location.add_player(player, 0, 0)
+    height, width = world.get_map_size()
+    full_map = {
+        "location_id": world.map_id,
+        "seq": world.version,
+        "location_size": (height, width),
+        "location_data": {f"{i},{j}": world.get_first_object(i, j).name for i in range(height) for j in range(width)},
+    }
+    return {
+        "player_update": player.get_player_parameters(),
+        "location_update": {f"{x},{x}": "grass" for x in range(20)},
+        "full_map": full_map,
+    }
+
+
+def measure(codec, payload, iterations: int) -> tuple[float, float, int]:
+    iterations = max(1, iterations)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        encoded = codec.encode(payload)
+    encode_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(iterations):
+        codec.decode(encoded)
+    decode_time = time.perf_counter() - start
+    return iterations / encode_time, iterations / decode_time, len(encoded)
+
+
+def main():
+    payloads = asyncio.run(build_payloads())
+    print(f"{'codec':>8} {'payload':>16} {'encode/s':>12} {'decode/s':>12} {'bytes':>8}")
+    for name in CODECS:
+        try:
+            codec = get_codec(name)
+        except CodecNotAvailableError:
+            print(f"{name:>8} not installed")
+            continue
+        for payload_name, payload in payloads.items():
+            iterations = ITERATIONS // 100 if payload_name == "full_map" else ITERATIONS
+            encode_rate, decode_rate, size = measure(codec, payload, iterations)
+            print(f"{name:>8} {payload_name:>16} {encode_rate:12.0f} {decode_rate:12.0f} {size:8d}")
+
+
+if __name__ == "__main__":
+    main()
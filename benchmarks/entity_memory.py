@@ -0,0 +1,30 @@
+import gc
+import sys
+import tracemalloc
+
+from game.item.registry import ITEM_TYPES, create_item
+from game.player import Player
+
+SAMPLES = 10_000
+
+
+def bytes_per_entity(factory, samples: int = SAMPLES) -> float:
+    gc.collect()
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    entities = [factory() for _ in range(samples)]
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (used - start - sys.getsizeof(entities)) / len(entities)
+
+
+def main():
+    results = {"player": bytes_per_entity(lambda: Player("user_id", "name"))}
+    for kind in ITEM_TYPES:
+        results[kind] = bytes_per_entity(lambda: create_item(kind))
+    for name, size in results.items():
+        print(f"{name:>16}: {size:8.1f} bytes per entity")
+
+
+if __name__ == "__main__":
+    main()
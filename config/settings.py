@@ -1,6 +1,6 @@
 import os
 import ssl
-from typing import Any
+from typing import Any, Literal
 
 from aiokafka.helpers import create_ssl_context
 from pydantic import BaseModel, model_validator
@@ -74,12 +74,18 @@ class KafkaProducerSettings(KafkaBaseSettingsMixin, BaseModel):
     base: KafkaSettings
     acks: int
     client_id: str
+    linger_ms: int = 0
+    max_batch_size: int = 16384
+    compression_type: Literal["gzip", "snappy", "lz4", "zstd"] | None = None
 
     def get_config(self) -> dict[str, Any]:
         return {
             **self._base_kafka_config(),
             "acks": self.acks,
             "client_id": self.client_id,
+            "linger_ms": self.linger_ms,
+            "max_batch_size": self.max_batch_size,
+            "compression_type": self.compression_type,
         }
 
 
@@ -90,6 +96,14 @@ class KafkaConsumerSettings(KafkaBaseSettingsMixin, BaseModel):
     session_timeout_ms: int
     auto_offset_reset: str
     enable_auto_commit: bool
+    # Not passed to aiokafka: with concurrent_lanes the consumer handles each user's events in order on its own
+    # lane and runs up to max_lanes lanes at once, sizing every fetch between the min and max bounds below.
+    concurrent_lanes: bool
+    max_lanes: int
+    min_fetch_records: int
+    max_fetch_records: int
+    min_fetch_timeout_ms: int
+    max_fetch_timeout_ms: int
 
     def get_config(self) -> dict[str, Any]:
         return {
@@ -107,10 +121,77 @@ class KafkaTopics(BaseModel):
     player_update_kafka_topic: str = "player_updates"
     game_update_kafka_topic: str = "game_updates"
     player_event_kafka_topic: str = "player_events"
+    observation_kafka_topic: str = "observations"
+
+
+class CodecSettings(BaseModel):
+    # Codec names: "json", "fast_json" (orjson when installed), "orjson", "msgpack".
+    default: str = "json"
+    topics: dict[str, str] = {}
+
+
+class TransportSettings(BaseModel):
+    # Where player events come from and updates go to: "kafka", "memory" (bots and tests creating the game in their
+    # own process; the game server refuses it) or "unix_socket" (bots on the same host, connecting to socket_path;
+    # by default in a directory private to the server user, $XDG_RUNTIME_DIR/npc_crawler or <tmp>/npc_crawler-<uid>).
+    backend: Literal["kafka", "memory", "unix_socket"] = "kafka"
+    socket_path: str | None = None
+    max_client_buffer: int = 8 * 1024 * 1024
+
+
+class MetricsSettings(BaseModel):
+    # Prometheus text endpoint at http://host:port/metrics.
+    enabled: bool = False
+    host: str = "127.0.0.1"
+    port: int = 9100
 
 
 class GameSettings(BaseModel):
     tick: int = 500
+    # Ticks whose work takes more than slow_tick_fraction of the tick are counted as slow. With slow_tick_profile_dir
+    # set, the event loop stack is sampled every slow_tick_sample_interval_ms during each tick and the samples of a
+    # slow tick are written there as a folded stack file, keeping the last slow_tick_max_profiles files.
+    slow_tick_fraction: float = 0.8
+    slow_tick_profile_dir: str | None = None
+    slow_tick_sample_interval_ms: int = 5
+    slow_tick_max_profiles: int = 100
+    # Player actions wait in a per-player queue of intent_queue_size intents (the overflow is dropped) and at most
+    # intents_per_tick of them are applied per player on every tick.
+    intent_queue_size: int = 4
+    intents_per_tick: int = 1
+    # Directory of the world snapshot and tick log; when set, a restart resumes the saved world instead of
+    # generating a new one. A snapshot is taken every snapshot_interval ticks.
+    world_store_dir: str | None = None
+    snapshot_interval: int = 600
+    world_log_fsync: bool = False
+    # Chunked open world: the main location is a world_size x world_size grid of chunk_size chunks, generated
+    # from world_seed on first access. At most max_loaded_chunks stay in memory besides the ones around players;
+    # evicted chunks that changed are saved to chunk_store_dir. Not covered by the world store.
+    chunked_world: bool = False
+    world_seed: int = 0
+    world_size: int = 1 << 20
+    chunk_size: int = 32
+    max_loaded_chunks: int = 1024
+    chunk_store_dir: str = "data/chunks"
+    chunk_prefetch_radius: int = 1
+    # Upper bound of the cells A* may expand while planning a move_to route.
+    path_max_nodes: int = 20000
+    # Number of location worker processes simulating the game; 0 keeps the whole game in the main process.
+    workers: int = 0
+    # Send each player only the location changes within view_radius cells of them instead of the whole map.
+    interest_management: bool = False
+    view_radius: int = 10
+    # With interest management, send only the cells in the player's field of view: solid objects block the sight.
+    line_of_sight: bool = False
+    # Publish the observation_window x observation_window views and vitals of all online players of a location as
+    # one NumPy batch per tick (needs the "observations" extra). Not available for the chunked world.
+    observations: bool = False
+    observation_window: int = 11
+    # Binary full maps are split into chunk messages of at most this many bytes.
+    full_map_chunk_bytes: int = 512 * 1024
+    # Bounds of the per-location history of map deltas kept for clients resuming from a sequence number.
+    delta_history_size: int = 1024
+    delta_history_bytes: int = 1024 * 1024
 
 
 class DBSettings(BaseModel):
@@ -120,14 +201,23 @@ class DBSettings(BaseModel):
     pool_size: int
     max_overflow: int
     current_schema: str = "public"
+    # Character stats are saved in the background: at most stats_batch_size characters per stats_flush_interval_ms,
+    # failed batches are retried after a delay doubling up to stats_max_retry_delay_ms.
+    stats_flush_interval_ms: int = 1000
+    stats_batch_size: int = 500
+    stats_max_retry_delay_ms: int = 30000
 
 
 class Settings(BaseSettings):
-    player: PlayerSettings  # = PlayerSettings()
-    kafka: KafkaSettings  # = KafkaSettings()
-    topic: KafkaTopics  # = KafkaTopics()
-    game: GameSettings  # = GameSettings()
-    db: DBSettings  # = DBSettings()
+    player: PlayerSettings = PlayerSettings()
+    # Kafka and the database are only needed by the server: the headless engine runs without them.
+    kafka: KafkaSettings | None = None
+    topic: KafkaTopics = KafkaTopics()
+    game: GameSettings = GameSettings()
+    db: DBSettings | None = None
+    codec: CodecSettings = CodecSettings()
+    transport: TransportSettings = TransportSettings()
+    metrics: MetricsSettings = MetricsSettings()
 
     # Consumer settings
     kafka_consumer_player_event_group: str = "game_server_group"
@@ -135,10 +225,19 @@ class Settings(BaseSettings):
     kafka_consumer_session_timeout_ms: int = 45000
     kafka_consumer_auto_offset_reset: str = "latest"
     kafka_consumer_enable_auto_commit: bool = False
+    kafka_consumer_concurrent_lanes: bool = False
+    kafka_consumer_max_lanes: int = 64
+    kafka_consumer_min_fetch_records: int = 10
+    kafka_consumer_max_fetch_records: int = 500
+    kafka_consumer_min_fetch_timeout_ms: int = 5
+    kafka_consumer_max_fetch_timeout_ms: int = 250
 
     # Producer settings
     kafka_producer_acks: int = 1
     kafka_producer_client_id: str = "game_server_producer"
+    kafka_producer_linger_ms: int = 0
+    kafka_producer_max_batch_size: int = 16384
+    kafka_producer_compression_type: str | None = None
 
     @classmethod
     def settings_customise_sources(
@@ -173,14 +272,18 @@ class Settings(BaseSettings):
     )
 
 
-def build_kafka_consumer_settings(settings: Settings):
+def build_kafka_consumer_settings(settings: Settings) -> KafkaConsumerSettings | None:
+    if settings.kafka is None:
+        return None
     return build_from_settings(base=settings.kafka,
                                settings=settings,
                                prefix="kafka_consumer",
                                model=KafkaConsumerSettings)
 
 
-def build_kafka_producer_settings(settings: Settings):
+def build_kafka_producer_settings(settings: Settings) -> KafkaProducerSettings | None:
+    if settings.kafka is None:
+        return None
     return build_from_settings(base=settings.kafka,
                                settings=settings,
                                prefix="kafka_producer",
@@ -53,4 +53,4 @@ db_helper = DBHelper(
     pool_size=settings.db.pool_size,
     max_overflow=settings.db.max_overflow,
     current_schema=settings.db.current_schema,
-)
+) if settings.db is not None else None
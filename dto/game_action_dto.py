@@ -1,9 +1,12 @@
 from typing import Literal, ClassVar
 
 from pydantic import Field
+from typing_extensions import Annotated
 
 from dto.base_action_dto import BaseActionDto
 
+FULL_MAP_FORMATS = ("json", "binary", "binary_rle")
+
 
 class CreatePlayerActionDTO(BaseActionDto):
     action: Literal["create_player"]
@@ -17,10 +20,19 @@ class GetPlayerActionDTO(BaseActionDto):
 
 class GetFullMapActionDTO(BaseActionDto):
     action: Literal["get_full_map"]
-    params_value: str = Field(min_length=1)
+    # [location_id, format], format is one of FULL_MAP_FORMATS and defaults to "json".
+    params_value: list[Annotated[str, Field(min_length=1)]] | None = None
+    max_params: ClassVar[int] = 2
     params_required: ClassVar[bool] = False
 
 
+class ResumeMapActionDTO(BaseActionDto):
+    action: Literal["resume_map"]
+    # [location_id, last sequence number the client has applied]
+    params_value: tuple[Annotated[str, Field(min_length=1)], Annotated[int, Field(ge=0)]]
+    max_params: ClassVar[int] = 2
+
+
 class LogoutDTO(BaseActionDto):
     action: Literal["logout"]
     params_value: None
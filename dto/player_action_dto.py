@@ -2,8 +2,10 @@ from pydantic import Field
 from typing_extensions import Annotated
 
 from dto.base_action_dto import BaseActionDto
+from game.item.registry import ITEM_TYPES
 from typing import Literal, Sequence, ClassVar
 
+COLLECTABLE_KINDS = tuple(kind for kind, item_type in ITEM_TYPES.items() if item_type.PROTOTYPE.collectable)
 move_actions = Literal["move_up", "move_down", "move_left", "move_right"]
 BoundedInt = Annotated[int, Field(ge=-1, le=1)]
 Direction = Annotated[Sequence[BoundedInt], Field(min_length=2, max_length=2)]
@@ -48,3 +50,15 @@ class AwakeTurnActionDTO(BaseActionDto):
     action: Literal["awake"]
     params_value: None
     params_required: ClassVar[bool] = False
+
+
+class MoveToActionDTO(BaseActionDto):
+    action: Literal["move_to"]
+    # [x, y] of the target cell
+    params_value: tuple[Annotated[int, Field(ge=0)], Annotated[int, Field(ge=0)]]
+    max_params: ClassVar[int] = 2
+
+
+class StepToNearestActionDTO(BaseActionDto):
+    action: Literal["step_to_nearest"]
+    params_value: Literal[COLLECTABLE_KINDS]
@@ -43,6 +43,26 @@ class PlayerNotFoundError(DefaultError):
         super().__init__(f'Player not found: {user_id}')
 
 
+class CodecNotAvailableError(DefaultError):
+    def __init__(self, name):
+        super().__init__(f'Codec is not available: {name}')
+
+
+class TransportError(DefaultError):
+    def __init__(self, name):
+        super().__init__(f'Transport error: {name}')
+
+
+class ObservationsNotAvailableError(DefaultError):
+    def __init__(self, name):
+        super().__init__(f'Observations need {name}: install the "observations" extra')
+
+
+class MapLayerNotAvailableError(DefaultError):
+    def __init__(self, map_id):
+        super().__init__(f'Map {map_id} has no single terrain layer: it is chunked')
+
+
 class GameMapConsumerError(DefaultError):
     def __init__(self, err):
         super().__init__({err})
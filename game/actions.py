@@ -2,6 +2,7 @@ from dto.game_action_dto import (
     CreatePlayerActionDTO,
     GetPlayerActionDTO,
     GetFullMapActionDTO,
+    ResumeMapActionDTO,
     LogoutDTO
 )
 from dto.player_action_dto import (
@@ -11,12 +12,15 @@ from dto.player_action_dto import (
     UseItemActionDTO,
     AttackActionDTO,
     SkipTurnActionDTO, AwakeTurnActionDTO,
+    MoveToActionDTO,
+    StepToNearestActionDTO,
 )
 
 actionDTOMapConfig = {
     "create_player": CreatePlayerActionDTO,
     "get_player": GetPlayerActionDTO,
     "get_full_map": GetFullMapActionDTO,
+    "resume_map": ResumeMapActionDTO,
     "logout": LogoutDTO,
 
     "move_up": MovePlayerActionDTO,
@@ -29,6 +33,8 @@ actionDTOMapConfig = {
     "attack": AttackActionDTO,
     "skip_turn": SkipTurnActionDTO,
     "awake": AwakeTurnActionDTO,
+    "move_to": MoveToActionDTO,
+    "step_to_nearest": StepToNearestActionDTO,
 }
 
 PLAYER_ACTIONS = [
@@ -42,11 +48,14 @@ PLAYER_ACTIONS = [
     "attack",
     "skip_turn",
     "awake",
+    "move_to",
+    "step_to_nearest",
 ]
 
 GAME_ACTIONS = [
     "create_player",
     "get_full_map",
+    "resume_map",
     "get_player",
     "logout"
 ]
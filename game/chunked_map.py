@@ -0,0 +1,363 @@
+import asyncio
+import os
+import random
+import struct
+import uuid
+from array import array
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Sequence
+
+from errors.errors import MapLayerNotAvailableError
+from game.delta_history import MapDeltaHistory
+from game.item.corpse import Corpse
+from game.item.def_object import DefaultObject
+from game.item.registry import create_item, get_prototype
+from game.map import Map
+from game.player import Player
+
+ChunkKey = tuple[int, int]
+
+# Chunk file layout (little-endian):
+#   header    <4sBH  magic "NPCC", format version, terrain palette size
+#   palette   item kinds of the terrain codes
+#   terrain   <I byte length + chunk_size * chunk_size u16 codes into the palette
+#   cells     <I count, then per occupied cell <H local index and <H depth + its items, top first
+# An item is its kind, 16-byte uuid, <i hp, name and corpse name. Strings are <H length + utf-8.
+CHUNK_MAGIC = b"NPCC"
+CHUNK_FORMAT_VERSION = 1
+_CHUNK_HEADER = struct.Struct("<4sBH")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_HP = struct.Struct("<i")
+
+# Reads and generates chunks off the event loop; the chunks are installed on the loop thread.
+_chunk_loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chunk-loader")
+
+
+class _Chunk:
+    __slots__ = ("terrain", "overlay", "modified")
+
+    def __init__(self, terrain: array, overlay: dict[int, list]):
+        self.terrain = terrain
+        self.overlay = overlay
+        self.modified = False
+
+
+def generate_chunk(seed: int, chunk_x: int, chunk_y: int, chunk_size: int,
+                   item_densities: dict[str, float]) -> list[tuple[int, str]]:
+    # (local cell index, item kind) pairs of a fresh chunk, always the same for the same seed and coordinates.
+    rng = random.Random(f"{seed}:{chunk_x}:{chunk_y}")
+    cells = chunk_size * chunk_size
+    kinds = [kind for kind, density in item_densities.items() for _ in range(int(cells * density))][:cells]
+    return list(zip(rng.sample(range(cells), len(kinds)), kinds))
+
+
+def encode_chunk(terrain_kinds: list[str], terrain_codes: bytes, cells: list[tuple[int, list[tuple]]]) -> bytes:
+    parts = [_CHUNK_HEADER.pack(CHUNK_MAGIC, CHUNK_FORMAT_VERSION, len(terrain_kinds))]
+    parts += [_encode_string(kind) for kind in terrain_kinds]
+    parts += [_U32.pack(len(terrain_codes)), terrain_codes, _U32.pack(len(cells))]
+    for local, items in cells:
+        parts.append(struct.pack("<HH", local, len(items)))
+        for kind, item_id, hp, name, corpse_name in items:
+            parts += [_encode_string(kind), item_id, _HP.pack(hp), _encode_string(name),
+                      _encode_string(corpse_name or "")]
+    return b"".join(parts)
+
+
+def decode_chunk(data: bytes) -> tuple:
+    # The (terrain kinds, terrain codes, cells) that encode_chunk was given.
+    magic, version, palette_size = _CHUNK_HEADER.unpack_from(data, 0)
+    if magic != CHUNK_MAGIC or version != CHUNK_FORMAT_VERSION:
+        raise ValueError("Unsupported chunk file")
+    offset = _CHUNK_HEADER.size
+    terrain_kinds = []
+    for _ in range(palette_size):
+        kind, offset = _decode_string(data, offset)
+        terrain_kinds.append(kind)
+    (length,) = _U32.unpack_from(data, offset)
+    offset += _U32.size
+    terrain_codes = bytes(data[offset:offset + length])
+    offset += length
+    (cell_count,) = _U32.unpack_from(data, offset)
+    offset += _U32.size
+    cells = []
+    for _ in range(cell_count):
+        local, depth = struct.unpack_from("<HH", data, offset)
+        offset += 4
+        items = []
+        for _ in range(depth):
+            kind, offset = _decode_string(data, offset)
+            item_id = bytes(data[offset:offset + 16])
+            (hp,) = _HP.unpack_from(data, offset + 16)
+            name, offset = _decode_string(data, offset + 16 + _HP.size)
+            corpse_name, offset = _decode_string(data, offset)
+            items.append((kind, item_id, hp, name, corpse_name or None))
+        cells.append((local, items))
+    return terrain_kinds, terrain_codes, cells
+
+
+def _encode_string(value: str) -> bytes:
+    encoded = value.encode("utf-8")
+    return _U16.pack(len(encoded)) + encoded
+
+
+def _decode_string(data: bytes, offset: int) -> tuple[str, int]:
+    (length,) = _U16.unpack_from(data, offset)
+    offset += _U16.size
+    return data[offset:offset + length].decode("utf-8"), offset + length
+
+
+class _ChunkedTerrain:
+    def __init__(self, world: "ChunkedMap"):
+        self._world = world
+
+    def __getitem__(self, index: int) -> int:
+        chunk, local = self._world._locate(index)
+        return chunk.terrain[local]
+
+    def __setitem__(self, index: int, code: int):
+        chunk, local = self._world._locate(index)
+        chunk.terrain[local] = code
+        chunk.modified = True
+
+
+class _ChunkedOverlay(MutableMapping):
+    def __init__(self, world: "ChunkedMap"):
+        self._world = world
+
+    def __getitem__(self, index: int) -> list:
+        return self._world._locate(index)[0].overlay[index]
+
+    def get(self, index: int, default=None):
+        return self._world._locate(index)[0].overlay.get(index, default)
+
+    def setdefault(self, index: int, default=None):
+        chunk = self._world._locate(index)[0]
+        chunk.modified = True
+        return chunk.overlay.setdefault(index, default)
+
+    def __setitem__(self, index: int, stack: list):
+        chunk = self._world._locate(index)[0]
+        chunk.overlay[index] = stack
+        chunk.modified = True
+
+    def __delitem__(self, index: int):
+        chunk = self._world._locate(index)[0]
+        del chunk.overlay[index]
+        chunk.modified = True
+
+    def __iter__(self) -> Iterator[int]:
+        for chunk in list(self._world._chunks.values()):
+            yield from list(chunk.overlay)
+
+    def __len__(self) -> int:
+        return sum(len(chunk.overlay) for chunk in self._world._chunks.values())
+
+
+# Map whose cells live in chunk_size x chunk_size chunks created on first access: loaded from store_dir when the
+# chunk was saved before, otherwise generated from the seed and the chunk coordinates. The base Map methods work
+# unchanged on top of chunk-backed terrain and overlay layers. At the end of every tick the chunks around players
+# are pinned, the least recently used ones beyond max_loaded_chunks are evicted (saved first if they changed) and
+# the chunks within prefetch_radius of players are read or generated in the background.
+# Full-map views (get_cells, get_overlay_cells, get_free_cells) only cover the chunks currently in memory.
+class ChunkedMap(Map):
+    def __init__(self, height: int, width: int, seed: int = 0, chunk_size: int = 32, max_loaded_chunks: int = 1024,
+                 store_dir: str | None = None, prefetch_radius: int = 1, item_densities: dict[str, float] = None,
+                 terrain: DefaultObject = None, history: MapDeltaHistory = None):
+        self._seed = seed
+        self._chunk_size = chunk_size
+        self._max_loaded_chunks = max_loaded_chunks
+        self._prefetch_radius = prefetch_radius
+        self._item_densities = item_densities or {}
+        self._chunks: OrderedDict[ChunkKey, _Chunk] = OrderedDict()
+        self._pending: dict[ChunkKey, asyncio.Future] = {}
+        self._players: set[Player] = set()
+        super().__init__(height, width, terrain, history)
+        # The id follows the seed, so the location keeps its id and its saved chunks across restarts.
+        self.map_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"chunked-world:{seed}"))
+        self._store_dir = os.path.join(store_dir, self.map_id) if store_dir else None
+        if self._store_dir:
+            os.makedirs(self._store_dir, exist_ok=True)
+
+    def _create_layers(self, height: int, width: int):
+        self._width = width
+        return _ChunkedTerrain(self), _ChunkedOverlay(self)
+
+    def get_spawn_area(self):
+        height, width = self.get_map_size()
+        spawn_size = self._chunk_size * 4
+        return min(height, spawn_size), min(width, spawn_size)
+
+    def get_terrain_layer(self):
+        # The whole world does not fit in one array; callers needing the full layer check for the chunked world.
+        raise MapLayerNotAvailableError(self.map_id)
+
+    def get_loaded_chunks(self) -> int:
+        return len(self._chunks)
+
+    def get_cells(self) -> dict[str, str]:
+        cells = {}
+        for chunk_x, chunk_y in list(self._chunks):
+            for local in range(self._chunk_size * self._chunk_size):
+                x = chunk_x * self._chunk_size + local // self._chunk_size
+                y = chunk_y * self._chunk_size + local % self._chunk_size
+                if self.in_bounds(x, y):
+                    cells[f"{x},{y}"] = self.get_first_object(x, y).name
+        return cells
+
+    def get_free_cells(self) -> Sequence[int]:
+        free_cells = []
+        for chunk_x, chunk_y in list(self._chunks):
+            for local in range(self._chunk_size * self._chunk_size):
+                x = chunk_x * self._chunk_size + local // self._chunk_size
+                y = chunk_y * self._chunk_size + local % self._chunk_size
+                if self.in_bounds(x, y) and not self.get_first_object(x, y).is_solid():
+                    free_cells.append(x * self._width + y)
+        return free_cells
+
+    async def flush_updates(self):
+        # Stacks changed in place (e.g. by remove_first_object) only show up as dirty cells.
+        for index in self.get_dirty_cells():
+            self._locate(index)[0].modified = True
+        await super().flush_updates()
+        self._evict_chunks()
+        self._prefetch_chunks()
+
+    def _index_object(self, obj, x: int, y: int):
+        super()._index_object(obj, x, y)
+        if isinstance(obj, Player):
+            self._players.add(obj)
+
+    def _unindex(self, obj, x: int, y: int):
+        super()._unindex(obj, x, y)
+        if isinstance(obj, Player):
+            self._players.discard(obj)
+
+    def _locate(self, index: int) -> tuple[_Chunk, int]:
+        x, y = divmod(index, self._width)
+        key = (x // self._chunk_size, y // self._chunk_size)
+        chunk = self._chunks.get(key)
+        if chunk is None:
+            # A prefetch still running for this chunk would install its older data over the changes made from now
+            # on, so it is dropped.
+            pending = self._pending.pop(key, None)
+            if pending is not None:
+                pending.cancel()
+            chunk = self._install_chunk(key, self._read_chunk(key))
+        else:
+            self._chunks.move_to_end(key)
+        return chunk, (x % self._chunk_size) * self._chunk_size + y % self._chunk_size
+
+    def _chunk_path(self, key: ChunkKey) -> str | None:
+        if self._store_dir is None:
+            return None
+        return os.path.join(self._store_dir, f"{key[0]}_{key[1]}.chunk")
+
+    def _read_chunk(self, key: ChunkKey) -> tuple:
+        # Runs on the loader thread as well: only reads immutable settings and files.
+        path = self._chunk_path(key)
+        if path and os.path.exists(path):
+            with open(path, "rb") as file:
+                return decode_chunk(file.read())
+        cells = generate_chunk(self._seed, *key, self._chunk_size, self._item_densities)
+        return None, None, [(local, [(kind, None, None, None, None)]) for local, kind in cells]
+
+    def _install_chunk(self, key: ChunkKey, data: tuple) -> _Chunk:
+        terrain_kinds, terrain_codes, cells = data
+        terrain = array("H", bytes(2 * self._chunk_size * self._chunk_size))
+        if terrain_codes is not None:
+            codes = [self._terrain_code(create_item(kind)) for kind in terrain_kinds]
+            saved = array("H")
+            saved.frombytes(terrain_codes)
+            terrain = array("H", (codes[code] for code in saved))
+        chunk = self._chunks[key] = _Chunk(terrain, {})
+        for local, items in cells:
+            x = key[0] * self._chunk_size + local // self._chunk_size
+            y = key[1] * self._chunk_size + local % self._chunk_size
+            stack = [self._restore_item(item, x, y) for item in items]
+            chunk.overlay[x * self._width + y] = stack
+        return chunk
+
+    def _restore_item(self, data: tuple, x: int, y: int) -> DefaultObject:
+        kind, item_id, hp, name, corpse_name = data
+        item = create_item(kind)
+        if get_prototype(kind).shared:
+            return item
+        if item_id is not None:
+            item.id = uuid.UUID(bytes=item_id)
+            item.hp = hp
+            if item.name != name:
+                item.name = name
+            if isinstance(item, Corpse):
+                item.corpse_name = corpse_name
+        item.set_position(x, y)
+        item.set_world_map(self)
+        self._index.insert(item, x, y)
+        return item
+
+    def _save_chunk(self, key: ChunkKey, chunk: _Chunk):
+        path = self._chunk_path(key)
+        if path is None:
+            return
+        cells = []
+        for index, stack in chunk.overlay.items():
+            local = (index // self._width % self._chunk_size) * self._chunk_size + index % self._width % self._chunk_size
+            cells.append((local, [(item.prototype.kind, item.id.bytes, item.hp, item.name,
+                                   item.corpse_name if isinstance(item, Corpse) else None) for item in stack]))
+        data = encode_chunk([terrain.prototype.kind for terrain in self._terrain_palette], chunk.terrain.tobytes(),
+                            cells)
+        with open(path + ".tmp", "wb") as file:
+            file.write(data)
+        os.replace(path + ".tmp", path)
+
+    def _pinned_chunks(self, radius: int) -> set[ChunkKey]:
+        pinned = set()
+        for player in self._players:
+            chunk_x, chunk_y = player.pos_x // self._chunk_size, player.pos_y // self._chunk_size
+            for dx in range(-radius, radius + 1):
+                for dy in range(-radius, radius + 1):
+                    pinned.add((chunk_x + dx, chunk_y + dy))
+        return pinned
+
+    def _evict_chunks(self):
+        if len(self._chunks) <= self._max_loaded_chunks:
+            return
+        pinned = self._pinned_chunks(max(1, self._prefetch_radius))
+        for key in list(self._chunks):
+            if len(self._chunks) <= self._max_loaded_chunks:
+                break
+            if key in pinned:
+                continue
+            chunk = self._chunks.pop(key)
+            for index, stack in chunk.overlay.items():
+                x, y = divmod(index, self._width)
+                for obj in stack:
+                    self._unindex(obj, x, y)
+            if chunk.modified:
+                self._save_chunk(key, chunk)
+
+    def _prefetch_chunks(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        height, width = self.get_map_size()
+        for key in self._pinned_chunks(self._prefetch_radius):
+            if key in self._chunks or key in self._pending:
+                continue
+            if not (0 <= key[0] * self._chunk_size < height and 0 <= key[1] * self._chunk_size < width):
+                continue
+            future = self._pending[key] = loop.run_in_executor(_chunk_loader, self._read_chunk, key)
+            future.add_done_callback(lambda done, chunk_key=key: self._on_chunk_read(chunk_key, done))
+
+    def _on_chunk_read(self, key: ChunkKey, future: asyncio.Future):
+        # Only the prefetch still registered for the chunk may install it: _locate drops the one of a chunk it
+        # loaded synchronously, which may have been changed, evicted and saved since.
+        if self._pending.get(key) is not future:
+            return
+        del self._pending[key]
+        if future.cancelled() or future.exception() is not None or key in self._chunks:
+            return
+        self._install_chunk(key, future.result())
@@ -0,0 +1,48 @@
+from collections import deque
+
+DEFAULT_MAX_DELTAS = 1024
+DEFAULT_MAX_BYTES = 1024 * 1024
+# Rough per-cell bookkeeping cost on top of the key and tile name lengths.
+_CELL_OVERHEAD = 16
+
+
+# Bounded ring buffer of the cell diffs of one map, stamped with the map version they produced. Old deltas are
+# dropped once either the count or the (estimated) byte budget is exceeded.
+class MapDeltaHistory:
+    def __init__(self, max_deltas: int = DEFAULT_MAX_DELTAS, max_bytes: int = DEFAULT_MAX_BYTES):
+        self._max_deltas = max_deltas
+        self._max_bytes = max_bytes
+        self._deltas: deque[tuple[int, dict[str, str], int]] = deque()
+        self._size = 0
+        self._last_seq = 0
+
+    def get_last_seq(self) -> int:
+        return self._last_seq
+
+    def append(self, seq: int, cells: dict[str, str]):
+        size = sum(len(cell) + len(name) + _CELL_OVERHEAD for cell, name in cells.items())
+        self._deltas.append((seq, cells, size))
+        self._size += size
+        self._last_seq = seq
+        while self._deltas and (len(self._deltas) > self._max_deltas or self._size > self._max_bytes):
+            _, _, dropped_size = self._deltas.popleft()
+            self._size -= dropped_size
+
+    def reset(self, seq: int):
+        # Forgets every delta: clients behind seq need a keyframe, e.g. after a bulk change that had no diff.
+        self._deltas.clear()
+        self._size = 0
+        self._last_seq = seq
+
+    def get_changes_since(self, seq: int) -> dict[str, str] | None:
+        # Returns the cells changed after seq merged into one diff, or None when seq has already fallen out of
+        # the window (or is ahead of it) and the client needs a fresh keyframe instead.
+        if seq == self._last_seq:
+            return {}
+        if seq > self._last_seq or not self._deltas or seq < self._deltas[0][0] - 1:
+            return None
+        changes = {}
+        for delta_seq, cells, _ in self._deltas:
+            if delta_seq > seq:
+                changes.update(cells)
+        return changes
@@ -0,0 +1,170 @@
+import math
+import weakref
+from typing import Iterable
+
+from game.game_observer import GameObjectObserver
+from game.map import Map
+from game.navigation import is_passable
+from game.player import Player
+
+RegionKey = tuple[int, int]
+# Opacity is kept in REGION_SIZE x REGION_SIZE regions, each with a version bumped whenever one of its cells
+# turns opaque or transparent.
+REGION_SHIFT = 4
+REGION_SIZE = 1 << REGION_SHIFT
+MAX_CACHED_VIEWS = 8192
+# Octant transforms of the shadowcasting: (xx, xy, yx, yy).
+_OCTANTS = ((1, 0, 0, 1), (0, 1, 1, 0), (0, -1, 1, 0), (-1, 0, 0, 1),
+            (-1, 0, 0, -1), (0, -1, -1, 0), (0, 1, -1, 0), (1, 0, 0, -1))
+
+
+class _Region:
+    __slots__ = ("opaque", "version")
+
+    def __init__(self, opaque: bytearray):
+        self.opaque = opaque
+        self.version = 0
+
+
+# Field of view over one map by recursive shadowcasting: the cells a player standing at x, y sees within radius,
+# as packed cell indexes. Solid objects block the sight (players do not) and the cells outside the map are never
+# visible. A view is cached under its position and radius together with the versions of the regions it covers,
+# so it is reused until the opacity of a cell around it changes. The cache observes the map to keep the region
+# opacity up to date; a version gap (place_bulk does not send a diff) drops everything.
+class FieldOfView(GameObjectObserver):
+    def __init__(self, world: Map):
+        # The map holds this cache as an observer and the module dictionary is keyed by the map, so a strong
+        # reference back would keep the map alive forever.
+        self._world = weakref.proxy(world)
+        self._width = world.get_map_size()[1]
+        self._regions: dict[RegionKey, _Region] = {}
+        self._views: dict[tuple[int, int, int], tuple[tuple[int, ...], frozenset[int]]] = {}
+        self._version = world.version
+
+    def get_visible(self, x: int, y: int, radius: int) -> frozenset[int]:
+        if self._world.version != self._version:
+            self._reset()
+        key = (x, y, radius)
+        versions = self._get_region_versions(x, y, radius)
+        cached = self._views.get(key)
+        if cached is not None and cached[0] == versions:
+            return cached[1]
+        visible = self._compute(x, y, radius)
+        if cached is None and len(self._views) >= MAX_CACHED_VIEWS:
+            del self._views[next(iter(self._views))]
+        self._views[key] = (versions, visible)
+        return visible
+
+    def is_opaque(self, x: int, y: int) -> bool:
+        region = self._get_region((x >> REGION_SHIFT, y >> REGION_SHIFT))
+        return bool(region.opaque[(x & (REGION_SIZE - 1)) * REGION_SIZE + (y & (REGION_SIZE - 1))])
+
+    async def update(self, data):
+        for delta in data.values():
+            if delta["seq"] != self._version + 1:
+                self._reset()
+                self._version = delta["seq"]
+                continue
+            self._version = delta["seq"]
+            for cell in delta["cells"]:
+                x, y = (int(value) for value in cell.split(","))
+                region = self._regions.get((x >> REGION_SHIFT, y >> REGION_SHIFT))
+                if region is None:
+                    continue
+                local = (x & (REGION_SIZE - 1)) * REGION_SIZE + (y & (REGION_SIZE - 1))
+                opaque = not is_passable(self._world, x, y)
+                if region.opaque[local] != opaque:
+                    region.opaque[local] = opaque
+                    region.version += 1
+
+    def _reset(self):
+        self._regions.clear()
+        self._views.clear()
+        self._version = self._world.version
+
+    def _get_region(self, key: RegionKey) -> _Region:
+        region = self._regions.get(key)
+        if region is None:
+            base_x, base_y = key[0] << REGION_SHIFT, key[1] << REGION_SHIFT
+            # Cells outside the map are opaque, is_passable says so.
+            region = self._regions[key] = _Region(bytearray(
+                not is_passable(self._world, base_x + dx, base_y + dy)
+                for dx in range(REGION_SIZE) for dy in range(REGION_SIZE)))
+        return region
+
+    def _get_region_versions(self, x: int, y: int, radius: int) -> tuple[int, ...]:
+        return tuple(self._get_region((region_x, region_y)).version
+                     for region_x in range((x - radius) >> REGION_SHIFT, ((x + radius) >> REGION_SHIFT) + 1)
+                     for region_y in range((y - radius) >> REGION_SHIFT, ((y + radius) >> REGION_SHIFT) + 1))
+
+    def _compute(self, x: int, y: int, radius: int) -> frozenset[int]:
+        if not self._world.in_bounds(x, y):
+            return frozenset()
+        visible = {x * self._width + y}
+        for octant in _OCTANTS:
+            self._cast(visible, x, y, radius, 1, 1.0, 0.0, *octant)
+        return frozenset(visible)
+
+    def _cast(self, visible: set[int], origin_x: int, origin_y: int, radius: int, row: int, start: float,
+              end: float, xx: int, xy: int, yx: int, yy: int):
+        # One octant of the shadowcasting: scans rows outwards between the start and end slopes and recurses
+        # into the part of the next rows left visible by each run of opaque cells.
+        if start < end:
+            return
+        radius_squared = radius * radius
+        height, width = self._world.get_map_size()
+        # Every cell within radius lies in a region created by _get_region_versions.
+        regions = self._regions
+        mask = REGION_SIZE - 1
+        new_start = start
+        for distance in range(row, radius + 1):
+            # Starts right before the first column within the start slope instead of at the edge of the row.
+            dx, dy = max(-distance - 1, math.ceil(-start * (distance + 0.5) - 0.5) - 2), -distance
+            blocked = False
+            while dx <= 0:
+                dx += 1
+                left_slope = (dx - 0.5) / (dy + 0.5)
+                right_slope = (dx + 0.5) / (dy - 0.5)
+                if start < right_slope:
+                    continue
+                if end > left_slope:
+                    break
+                x = origin_x + dx * xx + dy * xy
+                y = origin_y + dx * yx + dy * yy
+                if dx * dx + dy * dy <= radius_squared and 0 <= x < height and 0 <= y < width:
+                    visible.add(x * width + y)
+                opaque = regions[(x >> REGION_SHIFT, y >> REGION_SHIFT)].opaque[(x & mask) * REGION_SIZE + (y & mask)]
+                if blocked:
+                    if opaque:
+                        new_start = right_slope
+                        continue
+                    blocked = False
+                    start = new_start
+                elif opaque and distance < radius:
+                    blocked = True
+                    self._cast(visible, origin_x, origin_y, radius, distance + 1, start, left_slope, xx, xy, yx, yy)
+                    new_start = right_slope
+            if blocked:
+                break
+
+
+_fields_of_view: weakref.WeakKeyDictionary[Map, FieldOfView] = weakref.WeakKeyDictionary()
+
+
+def get_field_of_view(world: Map) -> FieldOfView:
+    field_of_view = _fields_of_view.get(world)
+    if field_of_view is None:
+        field_of_view = _fields_of_view[world] = FieldOfView(world)
+        world.add_observer(field_of_view)
+    return field_of_view
+
+
+def compute_visible_cells(players: Iterable[Player], radius: int) -> dict[str, frozenset[int]]:
+    # The per-tick batch: views of all the given players, user_id -> visible packed cell indexes. Players standing
+    # on the same cell share one view.
+    visible = {}
+    for player in players:
+        if player.world is None:
+            continue
+        visible[player.user_id] = get_field_of_view(player.world).get_visible(player.pos_x, player.pos_y, radius)
+    return visible
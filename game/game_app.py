@@ -1,12 +1,20 @@
 import threading
 import random
+from typing import TYPE_CHECKING
 
+from config.settings import settings
 from errors.errors import LocationNotFoundError
 from game.location import Location
 from game.game_observer import GameObjectObserver
 from game.player import Player
 from game.player_controller import PlayerController
 from game.location_generator import generate_main_location
+from game.scheduler import IntentScheduler
+from game.world_store import WorldStore
+
+if TYPE_CHECKING:
+    # Only for the annotations: the writer pulls in the database, which the game itself does not need.
+    from repository.stats_writer import StatsWriteBehind
 
 
 class Main:
@@ -25,36 +33,90 @@ class Main:
 
     def __init__(self):
         if not self._initialized:
-            self.locations: dict[str, Location] = {}
-            self.player_controllers: dict[str, PlayerController] = {}
-            self.main_location: Location | None = None
-            self.users: {str: bool} = {}
-            self.observers: dict[str, set] = {}
+            self._setup()
 
             Main._initialized = True
 
+    @classmethod
+    def create_isolated(cls) -> "Main":
+        # A game of its own next to the singleton, e.g. one of many headless simulations in one process.
+        game = super().__new__(cls)
+        game._setup()
+        return game
+
+    def _setup(self):
+        self.locations: dict[str, Location] = {}
+        self.player_controllers: dict[str, PlayerController] = {}
+        self.main_location: Location | None = None
+        self.users: set[str] = set()
+        self.scheduler = IntentScheduler(settings.game.intent_queue_size, settings.game.intents_per_tick)
+        self.observers: dict[str, set] = {}
+        self.world_store: WorldStore | None = None
+        self.stats_writer: "StatsWriteBehind | None" = None
+
     def add_user(self, user_id: str):
-        self.users[user_id] = False
+        self.users.add(user_id)
 
     def clear_users(self):
-        self.users = {}
-
-    def lock_user(self, user_id: str):
-        self.users[user_id] = True
-
-    def unlock_all_users(self):
-        for user_id in self.users:
-            self.unlock_user(user_id)
-
-    def unlock_user(self, user_id: str):
-        self.users[user_id] = False
+        self.users = set()
+
+    async def run_tick(self) -> int:
+        applied = await self.scheduler.run_tick()
+        await Player.advance_routes({location.get_map() for location in self.locations.values()})
+        await self.flush_updates()
+        return applied
+
+    async def flush_updates(self):
+        if self.world_store is not None:
+            dirty_cells = {map_id: set(location.get_map().get_dirty_cells())
+                           for map_id, location in self.locations.items()}
+        dirty_players = await Player.flush_updates([location.get_map() for location in self.locations.values()])
+        for location in self.locations.values():
+            await location.get_map().flush_updates()
+        if self.world_store is not None:
+            self.world_store.record_tick(self, dirty_players, dirty_cells)
+        if self.stats_writer is not None:
+            self.stats_writer.mark_dirty(dirty_players)
+
+    def set_world_store(self, world_store: WorldStore):
+        # Starts from a fresh snapshot, so the log only ever holds the ticks played after it.
+        self.world_store = world_store
+        world_store.write_snapshot(self)
+
+    def set_stats_writer(self, stats_writer: "StatsWriteBehind"):
+        # Players changed by a tick are handed to the writer, which saves their stats in the background.
+        self.stats_writer = stats_writer
+
+    def restore_world(self, world_store: WorldStore) -> bool:
+        world = world_store.restore()
+        if world is None:
+            return False
+        for location in world.locations:
+            for observer in self.observers.get(self._MAP_OBSERVER_NAME, ()):
+                location.get_map().add_observer(observer)
+            self.add_location(location)
+        self.main_location = self.locations.get(world.main_location_id, world.locations[0])
+        player_observers = self.observers.get(self._PLAYER_OBSERVER_NAME, ())
+        for player in world.players:
+            if player.is_dead or player.world is None:
+                continue
+            for observer in player_observers:
+                player.add_observer(observer)
+            self.locations[player.world.map_id].attach_player(player)
+            if player.user_id in world.online_user_ids:
+                self.player_controllers[player.user_id] = PlayerController(player)
+        return True
 
     def check_is_user_present(self, user_id) -> bool:
         return user_id in self.users
 
     async def generate_main_location(self) -> Location:
-        main_location = await generate_main_location()
-        for observer in self.observers.get(self._MAP_OBSERVER_NAME):
+        return await self.set_main_location(await generate_main_location())
+
+    async def set_main_location(self, main_location: Location) -> Location:
+        # The generated content is part of the initial full map, not a diff for the map observers.
+        await main_location.get_map().flush_updates()
+        for observer in self.observers.get(self._MAP_OBSERVER_NAME, ()):
             main_location.get_map().add_observer(observer)
         self.add_location(main_location)
         self.main_location = main_location
@@ -70,7 +132,7 @@ class Main:
         self.locations[location.get_map().map_id] = location
 
     async def create_player(self, name, user_id) -> Player:
-        max_height, max_width = self.main_location.get_location_size()
+        max_height, max_width = self.main_location.get_map().get_spawn_area()
         player = self.__create_default_player(name, user_id)
 
         player_coordinates = (random.randint(0, max_width - 1), random.randint(0, max_height - 1))
@@ -147,7 +209,8 @@ class Main:
         return player_controller
 
     def remove_user(self, user_id: str):
-        self.users.pop(user_id, None)
+        self.users.discard(user_id)
+        self.scheduler.remove(user_id)
         # self.player_controllers.pop(user_id, None)
 
     async def get_player_controller(self, user_id: str) -> PlayerController | None:
@@ -0,0 +1,76 @@
+import logging
+from abc import ABC, abstractmethod
+
+from config.settings import settings
+from game.game_app import Main
+from game.interest import InterestManager
+from game.observations import encode_observations
+from game.queue_wrapper import DefaultBufferQueue
+
+
+class TickSource(ABC):
+    # Returns the messages of the tick that just ended: {topic: {key: value}}, ready to be sent.
+    @abstractmethod
+    async def next_buffer(self) -> dict:
+        pass
+
+
+# Runs one tick of an in-process game: applies the scheduled intents, flushes the dirty players and maps and
+# drains the output buffer. Location updates go through the interest filter when it is enabled, and player
+# updates are kept only for players that are online; the idle ones skip their turn instead. With observations on,
+# every location with online players also gets one batch of their observations on the observation topic.
+class GameTick(TickSource):
+    def __init__(self, game: Main, output_queue: DefaultBufferQueue):
+        self.game = game
+        self._output_queue = output_queue
+        self._player_updates_topic = settings.topic.player_update_kafka_topic
+        self._location_updates_topic = settings.topic.location_update_kafka_topic
+        self._interest_manager = None
+        if settings.game.interest_management:
+            self._interest_manager = InterestManager(game, settings.game.view_radius,
+                                                    settings.game.line_of_sight)
+        self._observations_topic = settings.topic.observation_kafka_topic
+        self._observation_window = None
+        if settings.game.observations:
+            if settings.game.chunked_world:
+                logging.getLogger(__name__).warning("Observations are not available for the chunked world")
+            else:
+                self._observation_window = settings.game.observation_window
+
+    async def next_buffer(self) -> dict:
+        await self.game.run_tick()
+        buffer = await self._output_queue.drain_buffer()
+        if self._interest_manager is not None:
+            location_updates = buffer.get(self._location_updates_topic, {})
+            buffer[self._location_updates_topic] = self._interest_manager.build_updates(location_updates)
+        if self._player_updates_topic in buffer:
+            buffer[self._player_updates_topic] = await self._online_player_updates(buffer[self._player_updates_topic])
+        if self._observation_window is not None:
+            buffer[self._observations_topic] = self._build_observations()
+        return buffer
+
+    def _build_observations(self) -> dict[str, bytes]:
+        players_by_location = {}
+        for player_controller in self.game.player_controllers.values():
+            player = player_controller.get_player()
+            if player.world is not None:
+                players_by_location.setdefault(player.world.map_id, []).append(player)
+        observations = {}
+        for location_id, players in players_by_location.items():
+            location = self.game.locations.get(location_id)
+            if location is None:
+                continue
+            batch = location.get_observations(players, self._observation_window)
+            observations[location_id] = encode_observations(location.get_map(), [player.user_id for player in players],
+                                                            batch)
+        return observations
+
+    async def _online_player_updates(self, data: dict[str, dict]) -> dict[str, dict]:
+        updates = {}
+        for user_id, player_controller in list(self.game.player_controllers.items()):
+            user_params: dict | None = data.get(user_id, None)
+            if user_params is None:
+                await player_controller.skip_turn()
+                continue
+            updates[user_id] = user_params
+        return updates
@@ -0,0 +1,153 @@
+import random
+from contextlib import contextmanager
+from typing import Any, Sequence
+
+from pydantic import ValidationError
+
+from config.settings import settings
+from dto.base_action_dto import BaseActionDto
+from errors.action_errors import IncorrectParameters
+from game.actions import actionDTOMapConfig, PLAYER_ACTIONS
+from game.game_app import Main
+from game.game_observer import KafkaMapObserver, KafkaPlayerObserver
+from game.game_tick import GameTick
+from game.location_generator import generate_populated_location
+from game.observations import create_observations
+from game.player import Player
+from game.queue_wrapper import BufferQueueWithLock
+
+
+# The game without Kafka, the database or the wall clock, for training and evaluating NPC policies against the real
+# rules. reset(seed) builds a fresh world with one character per agent; step(actions) queues at most one action per
+# agent ({"action", "params"} as sent by clients, None to skip) and plays one tick the way the server does, then
+# returns the observations and the events of that tick. Each HeadlessGame has its own Main and its own random state,
+# so any number of them can be stepped one after another in a single process.
+#
+# Observations are the Location.get_observations records, one row per agent in agent_ids order (all zeros once the
+# agent is gone), or the player parameters by agent id when observation_window is None. Events hold the player and
+# location updates of the tick, the actions that were rejected or failed when applied and the agents that died.
+class HeadlessGame:
+    def __init__(self, agent_ids: Sequence[str], height: int = 100, width: int = 100,
+                 observation_window: int | None = 11):
+        self._agent_ids = list(agent_ids)
+        self._height = height
+        self._width = width
+        self._observation_window = observation_window
+        self._game: Main | None = None
+        self._game_tick: GameTick | None = None
+        self._random_state = random.Random().getstate()
+        self._rejected: dict[str, str] = {}
+
+    def get_game(self) -> Main:
+        return self._game
+
+    async def reset(self, seed: int):
+        if self._game is not None:
+            for player_controller in self._game.player_controllers.values():
+                player_controller.get_player().stop_route()
+        self._random_state = random.Random(seed).getstate()
+        with self._own_random():
+            game = Main.create_isolated()
+            output_queue = BufferQueueWithLock()
+            game.add_map_observer(KafkaMapObserver(output_queue))
+            game.add_player_observer(KafkaPlayerObserver(output_queue))
+            game.scheduler.set_handler(self.__apply_action)
+            location = await game.set_main_location(
+                await generate_populated_location(self._height, self._width, "headless"))
+            for agent_id in self._agent_ids:
+                player = await game.create_player(agent_id, agent_id)
+                await game.add_player_to_location(player, player.pos_x, player.pos_y, location.get_map().map_id)
+                await game.create_player_controller(player)
+                game.add_user(agent_id)
+            await game.flush_updates()
+            await output_queue.drain_buffer()
+        self._game = game
+        self._game_tick = GameTick(game, output_queue)
+        return self.get_observations()
+
+    async def step(self, actions: dict[str, dict | None]) -> tuple[Any, dict]:
+        rejected = self._rejected = {}
+        with self._own_random():
+            for agent_id, action in actions.items():
+                if action is None:
+                    continue
+                error = self.__submit(agent_id, action)
+                if error is not None:
+                    rejected[agent_id] = error
+            buffer = await self._game_tick.next_buffer()
+            dead = self.__remove_dead()
+        events = {
+            "players": buffer.get(settings.topic.player_update_kafka_topic, {}),
+            "locations": buffer.get(settings.topic.location_update_kafka_topic, {}),
+            "rejected": rejected,
+            "dead": dead,
+        }
+        return self.get_observations(), events
+
+    def get_observations(self):
+        players = {agent_id: player_controller.get_player()
+                   for agent_id, player_controller in self._game.player_controllers.items()}
+        if self._observation_window is None:
+            return {agent_id: player.get_player_parameters() for agent_id, player in players.items()}
+        rows = [row for row, agent_id in enumerate(self._agent_ids) if agent_id in players]
+        records = self._game.main_location.get_observations([players[self._agent_ids[row]] for row in rows],
+                                                            self._observation_window)
+        if len(rows) == len(self._agent_ids):
+            return records
+        observations = create_observations(len(self._agent_ids), self._observation_window)
+        observations[rows] = records
+        return observations
+
+    @contextmanager
+    def _own_random(self):
+        # The game draws from the module-level random, which is swapped for this game's state meanwhile.
+        outer_state = random.getstate()
+        random.setstate(self._random_state)
+        try:
+            yield
+        finally:
+            self._random_state = random.getstate()
+            random.setstate(outer_state)
+
+    def __submit(self, agent_id: str, action: dict) -> str | None:
+        if agent_id not in self._game.player_controllers:
+            return "Character is not in the game"
+        name = action.get("action", "")
+        action_dto_class = actionDTOMapConfig.get(name)
+        if action_dto_class is None or name not in PLAYER_ACTIONS:
+            return f"Unknown action: {name}"
+        params = action.get("params", [])
+        if params is None:
+            params = []
+        try:
+            action_dto = action_dto_class(action=name, params_value=params)
+        except (ValidationError, IncorrectParameters):
+            return f"Invalid parameters of {name}"
+        if not self._game.scheduler.submit(agent_id, action_dto):
+            return "Intent queue is full"
+        return None
+
+    async def __apply_action(self, user_id: str, action_dto: BaseActionDto):
+        player_controller = self._game.player_controllers.get(user_id)
+        if player_controller is None or player_controller.get_player().is_dead:
+            return
+        method = getattr(player_controller, action_dto.action, None)
+        if method is None or not callable(method):
+            return
+        # The DTO leaves params_value None when the action takes no parameters; 0 is a valid one.
+        try:
+            if action_dto.params_value is not None:
+                await method(action_dto.params_value)
+            else:
+                await method()
+        except Exception as err:
+            self._rejected[user_id] = f"{action_dto.action} failed: {err}"
+
+    def __remove_dead(self) -> list[str]:
+        dead = [user_id for user_id, player_controller in self._game.player_controllers.items()
+                if player_controller.get_player().is_dead]
+        for user_id in dead:
+            self._game.remove_user(user_id)
+            player: Player = self._game.player_controllers.pop(user_id).get_player()
+            player.stop_route()
+        return dead
@@ -0,0 +1,95 @@
+from game.fov import compute_visible_cells
+from game.game_app import Main
+from game.map import Map
+from game.player import Player
+
+Viewport = tuple[int, int, int, int]
+
+
+# Area-of-interest filter for location updates. Instead of broadcasting every cell change of a location under the
+# map_id, each online player gets only the changes inside their viewport, keyed by user_id. When a viewport moves,
+# the strip of cells that just became visible is sent along with the regular changes. Messages keep the
+# {"seq", "cells"} shape of location updates, stamped with the current version of the player's map.
+# With line_of_sight the viewport is narrowed down to the player's field of view: only visible cells are sent, and
+# the cells that came into sight (after a move or once an obstacle is gone) replace the viewport strip.
+class InterestManager:
+    def __init__(self, game: Main, view_radius: int, line_of_sight: bool = False):
+        self._game = game
+        self._view_radius = view_radius
+        self._line_of_sight = line_of_sight
+        self._viewports: dict[str, tuple[str, Viewport]] = {}
+        self._visible: dict[str, tuple[str, frozenset[int]]] = {}
+
+    def build_updates(self, location_updates: dict[str, dict]) -> dict[str, dict]:
+        radius = self._view_radius
+        online = self._game.player_controllers
+        visible = None
+        if self._line_of_sight:
+            visible = compute_visible_cells((controller.get_player() for controller in online.values()), radius)
+        user_updates: dict[str, dict[str, str]] = {}
+        for location_id, delta in location_updates.items():
+            location = self._game.locations.get(location_id)
+            if location is None:
+                continue
+            width = location.get_map().get_map_size()[1]
+            for cell, name in delta["cells"].items():
+                x, y = (int(value) for value in cell.split(","))
+                for player in location.get_players_in_rect(x - radius, y - radius, x + radius, y + radius):
+                    if visible is not None and x * width + y not in visible.get(player.user_id, ()):
+                        continue
+                    user_updates.setdefault(player.user_id, {})[cell] = name
+
+        viewports = {}
+        for user_id, player_controller in online.items():
+            player = player_controller.get_player()
+            if player.world is None:
+                continue
+            if visible is not None:
+                self._add_newly_seen(user_updates, player, visible[user_id])
+                continue
+            viewport = self._get_viewport(player)
+            viewports[user_id] = (player.world.map_id, viewport)
+            previous = self._viewports.get(user_id)
+            if previous == viewports[user_id]:
+                continue
+            previous_viewport = previous[1] if previous and previous[0] == player.world.map_id else None
+            strip = self._get_newly_visible(player.world, viewport, previous_viewport)
+            user_updates.setdefault(user_id, {}).update(strip)
+        self._viewports = viewports
+        if visible is not None:
+            self._visible = {user_id: self._visible[user_id] for user_id in visible if user_id in self._visible}
+
+        return {user_id: {"seq": online[user_id].get_player().world.version, "cells": cells}
+                for user_id, cells in user_updates.items() if user_id in online}
+
+    def _add_newly_seen(self, user_updates: dict[str, dict[str, str]], player: Player, cells: frozenset[int]):
+        world = player.world
+        previous = self._visible.get(player.user_id)
+        self._visible[player.user_id] = (world.map_id, cells)
+        if previous is not None and previous[0] == world.map_id:
+            if previous[1] is cells:
+                return
+            cells = cells - previous[1]
+        width = world.get_map_size()[1]
+        strip = user_updates.setdefault(player.user_id, {})
+        for index in cells:
+            x, y = divmod(index, width)
+            strip[f"{x},{y}"] = world.get_first_object(x, y).name
+
+    def _get_viewport(self, player: Player) -> Viewport:
+        height, width = player.world.get_map_size()
+        return (max(0, player.pos_x - self._view_radius),
+                max(0, player.pos_y - self._view_radius),
+                min(height - 1, player.pos_x + self._view_radius),
+                min(width - 1, player.pos_y + self._view_radius))
+
+    @staticmethod
+    def _get_newly_visible(world: Map, viewport: Viewport, previous: Viewport | None) -> dict[str, str]:
+        min_x, min_y, max_x, max_y = viewport
+        cells = {}
+        for x in range(min_x, max_x + 1):
+            for y in range(min_y, max_y + 1):
+                if previous and previous[0] <= x <= previous[2] and previous[1] <= y <= previous[3]:
+                    continue
+                cells[f"{x},{y}"] = world.get_first_object(x, y).name
+        return cells
@@ -1,9 +1,11 @@
 from game.item.def_object import DefaultObject
+from game.item.prototype import ItemPrototype
 
 
 class Corpse(DefaultObject):
+    __slots__ = ("corpse_name",)
+    PROTOTYPE = ItemPrototype(kind="corpse", name="corpse", hp=40)
+
     def __init__(self):
         super().__init__()
-        self.name = "corpse"
-        self.hp = 40
         self.corpse_name = "default"
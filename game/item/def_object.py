@@ -1,19 +1,36 @@
 import uuid
 
+from game.item.prototype import ItemPrototype
+
 
 class DefaultObject:
+    __slots__ = ("pos_x", "pos_y", "id", "prototype", "hp", "world_map")
+    PROTOTYPE = ItemPrototype(kind="void", name="void")
+
     def __init__(self):
         self.pos_x = 0
         self.pos_y = 0
         self.id = uuid.uuid4()
-        self.name = "void"
-        self.__is_solid: bool = False
-        self.__is_collectable: bool = False
-        self.__is_consumable: bool = False
-        self.action: dict[str, object] = {"action": "do_nothing", "params": 0}
-        self.hp = -999
+        self.prototype: ItemPrototype = self.PROTOTYPE
+        self.hp = self.prototype.hp
         self.world_map = None
 
+    @property
+    def name(self):
+        return self.prototype.name
+
+    @name.setter
+    def name(self, value: str):
+        self.prototype = self.prototype.with_changes(name=value)
+
+    @property
+    def action(self):
+        return self.prototype.action
+
+    @action.setter
+    def action(self, value: dict[str, object]):
+        self.prototype = self.prototype.with_changes(action=value)
+
     def get_world_map(self):
         return self.world_map
 
@@ -32,6 +49,9 @@ class DefaultObject:
             self.hp -= amount
             if self.hp <= 0:
                 await self.world_map.remove_object_by_id(self.pos_x, self.pos_y, self.id)
+            elif self.world_map is not None:
+                # The tile does not change, but the cell state does, e.g. for the world log.
+                self.world_map.mark_cell_dirty(self.pos_x, self.pos_y)
 
     def get_id(self):
         return self.id
@@ -40,22 +60,22 @@ class DefaultObject:
         return self.name
 
     def is_solid(self):
-        return self.__is_solid
+        return self.prototype.solid
 
     def is_collectable(self):
-        return self.__is_collectable
+        return self.prototype.collectable
 
     def is_consumable(self):
-        return self.__is_consumable
+        return self.prototype.consumable
 
     def set_consumable(self, is_consumable: bool):
-        self.__is_consumable = is_consumable
+        self.prototype = self.prototype.with_changes(consumable=is_consumable)
 
     def set_collectable(self, value: bool):
-        self.__is_collectable = value
+        self.prototype = self.prototype.with_changes(collectable=value)
 
     def set_solid(self, value: bool):
-        self.__is_solid = value
+        self.prototype = self.prototype.with_changes(solid=value)
 
     def set_action(self, action: str):
         self.action = action
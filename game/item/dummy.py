@@ -1,9 +1,7 @@
 from game.item.def_object import DefaultObject
+from game.item.prototype import ItemPrototype
 
 
 class Dummy(DefaultObject):
-    def __init__(self):
-        super().__init__()
-        self.name = "dummy"
-        self.hp = 100
-        self.set_solid(True)
+    __slots__ = ()
+    PROTOTYPE = ItemPrototype(kind="dummy", name="dummy", solid=True, hp=100)
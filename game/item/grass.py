@@ -1,8 +1,7 @@
 from game.item.def_object import DefaultObject
+from game.item.prototype import ItemPrototype
 
 
 class Grass(DefaultObject):
-    def __init__(self):
-        super().__init__()
-        self.name = "grass"
-         
\ No newline at end of file
+    __slots__ = ()
+    PROTOTYPE = ItemPrototype(kind="grass", name="grass", shared=True)
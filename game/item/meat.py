@@ -1,11 +1,8 @@
 from game.item.def_object import DefaultObject
+from game.item.prototype import ItemPrototype
 
 
 class Meat(DefaultObject):
-    def __init__(self):
-        super().__init__()
-        self.set_collectable(True)
-        self.set_consumable(True)
-        self.action = {"action": "decrease_hungry", "params": [20]}
-        self.name = "meat"
-        self.hp = 10
+    __slots__ = ()
+    PROTOTYPE = ItemPrototype(kind="meat", name="meat", collectable=True, consumable=True,
+                              action={"action": "decrease_hungry", "params": [20]}, hp=10)
@@ -0,0 +1,19 @@
+from dataclasses import dataclass, field, replace
+
+
+# Immutable description of an item kind. One instance is shared by every item of that kind; setters on
+# DefaultObject swap an item to a modified copy instead of mutating the shared prototype.
+@dataclass(frozen=True, eq=False)
+class ItemPrototype:
+    kind: str
+    name: str
+    solid: bool = False
+    collectable: bool = False
+    consumable: bool = False
+    action: dict[str, object] = field(default_factory=lambda: {"action": "do_nothing", "params": 0})
+    hp: int = -999
+    # Shared kinds have no per-instance state, so a single object is reused for every cell they occupy.
+    shared: bool = False
+
+    def with_changes(self, **changes) -> "ItemPrototype":
+        return replace(self, **changes)
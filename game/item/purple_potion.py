@@ -1,11 +1,8 @@
 from game.item.def_object import DefaultObject
+from game.item.prototype import ItemPrototype
 
 
 class SleepPotion(DefaultObject):
-    def __init__(self):
-        super().__init__()
-        self.set_collectable(True)
-        self.set_consumable(True)
-        self.action = {"action": "sleep", "params": []}
-        self.name = "red potion"
-        self.hp = 5
+    __slots__ = ()
+    PROTOTYPE = ItemPrototype(kind="sleep_potion", name="red potion", collectable=True, consumable=True,
+                              action={"action": "sleep", "params": []}, hp=5)
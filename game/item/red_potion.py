@@ -1,11 +1,8 @@
 from game.item.def_object import DefaultObject
+from game.item.prototype import ItemPrototype
 
 
 class HealthPotion(DefaultObject):
-    def __init__(self):
-        super().__init__()
-        self.set_collectable(True)
-        self.set_consumable(True)
-        self.action = {"action": "increase_health", "params": [30]}
-        self.name = "red potion"
-        self.hp = 5
+    __slots__ = ()
+    PROTOTYPE = ItemPrototype(kind="health_potion", name="red potion", collectable=True, consumable=True,
+                              action={"action": "increase_health", "params": [30]}, hp=5)
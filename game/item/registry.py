@@ -0,0 +1,41 @@
+from game.item.corpse import Corpse
+from game.item.def_object import DefaultObject
+from game.item.dummy import Dummy
+from game.item.grass import Grass
+from game.item.meat import Meat
+from game.item.prototype import ItemPrototype
+from game.item.purple_potion import SleepPotion
+from game.item.red_potion import HealthPotion
+from game.item.sword import Sword
+from game.item.tree import Tree
+from game.item.yellow_potion import EnergyPotion
+
+ITEM_TYPES: dict[str, type[DefaultObject]] = {
+    item_type.PROTOTYPE.kind: item_type for item_type in (
+        Grass,
+        Tree,
+        Meat,
+        Sword,
+        Dummy,
+        HealthPotion,
+        EnergyPotion,
+        SleepPotion,
+        Corpse,
+    )
+}
+
+_shared_items: dict[str, DefaultObject] = {}
+
+
+def get_prototype(kind: str) -> ItemPrototype:
+    return ITEM_TYPES[kind].PROTOTYPE
+
+
+def create_item(kind: str) -> DefaultObject:
+    item_type = ITEM_TYPES[kind]
+    if not item_type.PROTOTYPE.shared:
+        return item_type()
+    item = _shared_items.get(kind)
+    if item is None:
+        item = _shared_items[kind] = item_type()
+    return item
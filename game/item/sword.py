@@ -1,11 +1,8 @@
 from game.item.def_object import DefaultObject
+from game.item.prototype import ItemPrototype
 
 
 class Sword(DefaultObject):
-    def __init__(self):
-        super().__init__()
-        self.set_collectable(True)
-        self.action = {"action": "attack", "params": [(1, 12)]}
-        self.name = "sword"
-        self.hp = 100
-        
\ No newline at end of file
+    __slots__ = ()
+    PROTOTYPE = ItemPrototype(kind="sword", name="sword", collectable=True,
+                              action={"action": "attack", "params": [(1, 12)]}, hp=100)
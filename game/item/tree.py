@@ -1,9 +1,7 @@
 from game.item.def_object import DefaultObject
+from game.item.prototype import ItemPrototype
 
 
 class Tree(DefaultObject):
-    def __init__(self):
-        super().__init__()
-        self.set_solid(True)
-        self.name = "tree"
-
+    __slots__ = ()
+    PROTOTYPE = ItemPrototype(kind="tree", name="tree", solid=True, shared=True)
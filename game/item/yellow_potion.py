@@ -1,11 +1,8 @@
 from game.item.def_object import DefaultObject
+from game.item.prototype import ItemPrototype
 
 
 class EnergyPotion(DefaultObject):
-    def __init__(self):
-        super().__init__()
-        self.set_collectable(True)
-        self.set_consumable(True)
-        self.action = {"action": "increase_energy", "params": [50]}
-        self.name = "yellow potion"
-        self.hp = 5
+    __slots__ = ()
+    PROTOTYPE = ItemPrototype(kind="energy_potion", name="yellow potion", collectable=True, consumable=True,
+                              action={"action": "increase_energy", "params": [50]}, hp=5)
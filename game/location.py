@@ -1,7 +1,10 @@
+from typing import Sequence
+
 from errors.errors import ObjectPositionIsOutOfBoundsError, PositionIsOccupiedError, PlayerPositionIsOutOfBoundsError
 from game.item.def_object import DefaultObject
 from game.item.grass import Grass
 from game.map import Map
+from game.observations import build_observations
 from game.player import Player
 
 
@@ -11,12 +14,14 @@ class Location:
         self.__location_map: Map = location_map
         # self.__location_id = location_map.map_id
         self.__players = {}
-        self.__location_height = len(location_map.location_map)
-        self.__location_width = len(location_map.location_map[0])
+        self.__location_height, self.__location_width = location_map.get_map_size()
 
     def get_map(self):
         return self.__location_map
 
+    def get_name(self):
+        return self.__location_name
+
     def get_location_size(self):
         return self.__location_height, self.__location_width
 
@@ -32,6 +37,11 @@ class Location:
         player.set_position(x, y)
         self.__players[player.char_id] = player
 
+    def attach_player(self, player: Player):
+        # Registers a player that already stands on the map, e.g. one restored from a world snapshot.
+        player.world = self.__location_map
+        self.__players[player.char_id] = player
+
     async def remove_player(self, player: Player):
         char_id = player.char_id
         if char_id in self.__players:
@@ -46,9 +56,40 @@ class Location:
         if obj_on_map.is_solid():
             raise PositionIsOccupiedError(f"x = {pos_x}, y = {pos_y} is occupied!")
         if game_object is not Grass:
-            game_object.world_map = self.__location_map
             await self.__location_map.place_object(game_object, pos_x, pos_y)
-            game_object.set_position(pos_x, pos_y)
+            if not game_object.prototype.shared:
+                game_object.world_map = self.__location_map
+                game_object.set_position(pos_x, pos_y)
+
+    def place_bulk(self, cells: Sequence[int], kinds: Sequence[str]) -> list[DefaultObject]:
+        size = self.__location_height * self.__location_width
+        for index in cells:
+            if not 0 <= index < size:
+                raise ObjectPositionIsOutOfBoundsError(
+                    f"Location ID: {self.__location_map.map_id}\n cell {index} out of bounds, cells = {size}")
+            x, y = divmod(index, self.__location_width)
+            if self.__location_map.get_first_object(x, y).is_solid():
+                raise PositionIsOccupiedError(f"x = {x}, y = {y} is occupied!")
+        return self.__location_map.place_bulk(cells, kinds)
 
     def get_players(self):
         return self.__players
+
+    def get_observations(self, players: Sequence[Player], window: int):
+        # A NumPy record per player: the window x window view around them and their vitals, see game.observations.
+        return build_observations(self.__location_map, players, window)
+
+    def get_entities_within_radius(self, x: int, y: int, radius: int) -> list:
+        return list(self.__location_map.get_index().query_radius(x, y, radius))
+
+    def get_players_in_rect(self, min_x: int, min_y: int, max_x: int, max_y: int) -> list[Player]:
+        return [entity for entity in self.__location_map.get_index().query_rect(min_x, min_y, max_x, max_y)
+                if isinstance(entity, Player)]
+
+    def find_nearest_collectable(self, x: int, y: int, kind: str | None = None, max_radius: int | None = None):
+        def is_wanted(entity) -> bool:
+            if not entity.is_collectable():
+                return False
+            return kind is None or (isinstance(entity, DefaultObject) and entity.prototype.kind == kind)
+
+        return self.__location_map.get_index().nearest(x, y, is_wanted, max_radius)
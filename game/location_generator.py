@@ -1,70 +1,69 @@
-import copy
 import random
 
-from errors.errors import PositionIsOccupiedError
-from game.item.dummy import Dummy
-from game.item.grass import Grass
-from game.item.meat import Meat
-from game.item.red_potion import HealthPotion
-from game.item.sword import Sword
-from game.item.tree import Tree
-from game.item.yellow_potion import EnergyPotion
+from config.settings import settings
+from game.chunked_map import ChunkedMap
+from game.delta_history import MapDeltaHistory
+from game.item.registry import create_item
 from game.location import Location
 from game.map import Map
 
 
-async def add_objects_to_map_in_random_places(location, object_type, amount: int):
-    i = 0
-    tries = 0
-    max_tries = 10
-    while i < amount:
-        tries += 1
-        obj = copy.copy(object_type)
-        loc_len, loc_width = location.get_location_size()
-        pos_x = random.randint(0, loc_len - 1)
-        pos_y = random.randint(0, loc_width - 1)
-        try:
-            await location.add_object_to_world(obj, pos_x, pos_y)
-        except PositionIsOccupiedError:
-            if tries > max_tries:
-                i += 1
-            continue
-        i += 1
+def add_objects_to_map_in_random_places(location: Location, amounts: dict[str, int]):
+    # Draws all the cells at once, without replacement, from the cells that are free before the placement, so
+    # every object gets a cell of its own.
+    free_cells = location.get_map().get_free_cells()
+    total = min(sum(amounts.values()), len(free_cells))
+    cells = random.sample(free_cells, total)
+    kinds = [kind for kind, amount in amounts.items() for _ in range(amount)][:total]
+    location.place_bulk(cells, kinds)
+
+
+# Share of the cells covered by each kind of object.
+MAIN_LOCATION_ITEMS = {
+    "tree": 0.2,
+    "meat": 0.015,
+    "sword": 0.001,
+    "dummy": 0.002,
+    "health_potion": 0.005,
+    "energy_potion": 0.005,
+}
 
 
 async def generate_main_location() -> Location:
-    location_height = 100
-    location_width = 100
-    tree_coefficient = 0.2
-    meet_coefficient = 0.015
-    sword_coefficient = 0.001
-    health_potion_coefficient = 0.005
-    energy_potion_coefficient = 0.005
-    dummy_coefficient = 0.002
-    main_location = await generate_location(location_height, location_width, "Aisuron")
-    tree = Tree()
-    await add_objects_to_map_in_random_places(main_location, tree,
-                                              int(location_height * location_width * tree_coefficient))
-    meat = Meat()
-    await add_objects_to_map_in_random_places(main_location, meat,
-                                              int(location_height * location_width * meet_coefficient))
-    sword = Sword()
-    await add_objects_to_map_in_random_places(main_location, sword,
-                                              int(location_height * location_width * sword_coefficient))
-    dummy = Dummy()
-    await add_objects_to_map_in_random_places(main_location, dummy,
-                                              int(location_height * location_width * dummy_coefficient))
-    hp_potion = HealthPotion()
-    await add_objects_to_map_in_random_places(main_location, hp_potion,
-                                              int(location_height * location_width * health_potion_coefficient))
-    en_potion = EnergyPotion()
-    await add_objects_to_map_in_random_places(main_location, en_potion,
-                                              int(location_height * location_width * energy_potion_coefficient))
-    return main_location
+    if settings.game.chunked_world:
+        return generate_chunked_location("Aisuron")
+    return await generate_populated_location(100, 100, "Aisuron")
+
+
+async def generate_populated_location(height: int, width: int, name: str,
+                                      item_densities: dict[str, float] = None) -> Location:
+    if item_densities is None:
+        item_densities = MAIN_LOCATION_ITEMS
+    location = await generate_location(height, width, name)
+    cells = height * width
+    add_objects_to_map_in_random_places(location, {
+        kind: int(cells * coefficient) for kind, coefficient in item_densities.items()
+    })
+    return location
 
 
 async def generate_location(height: int, width: int, name: str) -> Location:
-    grass_map = [[[Grass()] for _ in range(width)] for _ in range(height)]
-    main_map = Map(grass_map)
+    history = MapDeltaHistory(settings.game.delta_history_size, settings.game.delta_history_bytes)
+    main_map = Map(height, width, create_item("grass"), history)
     location = Location(main_map, name)
     return location
+
+
+def generate_chunked_location(name: str) -> Location:
+    game_settings = settings.game
+    history = MapDeltaHistory(game_settings.delta_history_size, game_settings.delta_history_bytes)
+    world = ChunkedMap(game_settings.world_size, game_settings.world_size,
+                       seed=game_settings.world_seed,
+                       chunk_size=game_settings.chunk_size,
+                       max_loaded_chunks=game_settings.max_loaded_chunks,
+                       store_dir=game_settings.chunk_store_dir,
+                       prefetch_radius=game_settings.chunk_prefetch_radius,
+                       item_densities=MAIN_LOCATION_ITEMS,
+                       terrain=create_item("grass"),
+                       history=history)
+    return Location(world, name)
@@ -1,92 +1,269 @@
 import uuid
+from array import array
+from typing import Sequence
 
 from game.item.corpse import Corpse
 from game.item.def_object import DefaultObject
+from game.delta_history import MapDeltaHistory
+from game.item.registry import create_item
+from game.spatial_index import SpatialIndex
 
 
+# The base layer is a row-major array of terrain codes pointing into a small palette of shared terrain objects.
+# Items, players and corpses live in a sparse overlay: packed cell index -> stack of objects (top first), kept
+# only for occupied cells. Every non-shared object of the overlay is also tracked by a spatial index.
+# Mutations only mark their packed cell indexes dirty; flush_updates, called once per tick, builds a single diff of
+# the dirty cells and bumps the map version, which also serves as the sequence number of that diff.
 class Map:
     __DEFAULT_SIZE = 10
-    __observers = set()
+    __INDEX_BUCKET_SIZE = 8
     __map_width = 0
     __map_height = 0
 
-    def __init__(self, loc_map=None):
-        if loc_map is None:
-            loc_map = [[[] for _ in range(self.__DEFAULT_SIZE)] for _ in range(self.__DEFAULT_SIZE)]
-        self.location_map = loc_map
-        self.__map_width = len(loc_map[0])
-        self.__map_height = len(loc_map)
+    def __init__(self, height: int = __DEFAULT_SIZE, width: int = __DEFAULT_SIZE, terrain: DefaultObject = None,
+                 history: MapDeltaHistory = None):
+        if terrain is None:
+            terrain = create_item("grass")
+        if history is None:
+            history = MapDeltaHistory()
+        self.__map_height = height
+        self.__map_width = width
+        self._terrain_palette: list[DefaultObject] = [terrain]
+        self._terrain, self._overlay = self._create_layers(height, width)
+        self._index = SpatialIndex(self.__INDEX_BUCKET_SIZE)
+        self._history = history
+        self._observers = set()
+        self._dirty_cells: set[int] = set()
+        # Players on this map changed since the last Player.flush_updates, in the order they were first changed.
+        self._dirty_players: dict = {}
         self.map_id = str(uuid.uuid4())
+        self.version = 0
+
+    def _create_layers(self, height: int, width: int) -> tuple[array, dict[int, list]]:
+        return array("H", bytes(2 * height * width)), {}
 
     def add_observer(self, observer):
-        self.__observers.add(observer)
+        self._observers.add(observer)
 
     def remove_observer(self, observer):
-        self.__observers.remove(observer)
-
-    def get_map(self):
-        return self.location_map
-
-    def set_map(self, init_map):
-        self.location_map = init_map
+        self._observers.remove(observer)
 
     def get_map_size(self):
         return self.__map_height, self.__map_width
 
+    def get_spawn_area(self):
+        return self.get_map_size()
+
+    def in_bounds(self, x: int, y: int) -> bool:
+        return 0 <= x < self.__map_height and 0 <= y < self.__map_width
+
+    def get_cells(self) -> dict[str, str]:
+        # The top object name of every cell the map holds in memory, which for this map is all of them.
+        return {f"{x},{y}": self.get_first_object(x, y).name
+                for x in range(self.__map_height) for y in range(self.__map_width)}
+
+    def get_index(self) -> SpatialIndex:
+        return self._index
+
+    def get_terrain_layer(self) -> tuple[array, list[DefaultObject]]:
+        return self._terrain, self._terrain_palette
+
+    def load_terrain_layer(self, terrain: array, palette: list[DefaultObject]):
+        self._terrain = terrain
+        self._terrain_palette = palette
+
+    def get_overlay_cells(self):
+        return self._overlay.items()
+
+    def get_free_cells(self) -> Sequence[int]:
+        # Packed indexes of the cells whose top object is not solid.
+        solid_codes = {code for code, terrain in enumerate(self._terrain_palette) if terrain.is_solid()}
+        free_cells = range(self.__map_height * self.__map_width)
+        if solid_codes:
+            free_cells = [index for index, code in enumerate(self._terrain) if code not in solid_codes]
+        blocked = {index for index, stack in self._overlay.items() if stack[0].is_solid()}
+        if blocked:
+            free_cells = [index for index in free_cells if index not in blocked]
+        return free_cells
+
+    def get_dirty_cells(self) -> set[int]:
+        return self._dirty_cells
+
+    def mark_cell_dirty(self, x: int, y: int):
+        self._dirty_cells.add(self._cell_index(x, y))
+
+    def mark_player_dirty(self, player):
+        self._dirty_players[player] = None
+
+    def take_dirty_players(self) -> list:
+        dirty_players, self._dirty_players = list(self._dirty_players), {}
+        return dirty_players
+
+    def get_changes_since(self, seq: int) -> dict[str, str] | None:
+        return self._history.get_changes_since(seq)
+
     def get_first_object(self, x, y):
-        return self.location_map[x][y][0]
+        index = self._cell_index(x, y)
+        stack = self._overlay.get(index)
+        if stack:
+            return stack[0]
+        return self._terrain_palette[self._terrain[index]]
 
     def get_objects(self, x, y):
-        return self.location_map[x][y]
+        index = self._cell_index(x, y)
+        terrain = self._terrain_palette[self._terrain[index]]
+        stack = self._overlay.get(index)
+        if stack:
+            return [*stack, terrain]
+        return [terrain]
+
+    def set_objects(self, x: int, y: int, objects: list):
+        # Replaces the whole cell, objects ordered as get_objects returns them: the stack top first, terrain last.
+        # Used to restore saved state, so nothing is marked dirty.
+        index = self._cell_index(x, y)
+        for obj in self._overlay.pop(index, ()):
+            self._unindex(obj, x, y)
+        *stack, terrain = objects
+        self._terrain[index] = self._terrain_code(terrain)
+        if stack:
+            self._overlay[index] = stack
+            for obj in stack:
+                if not self._is_shared(obj):
+                    obj.set_position(x, y)
+                self._index_object(obj, x, y)
 
     async def notify_observers(self, data):
-        for observer in self.__observers:
+        for observer in self._observers:
             await observer.update(data)
 
     async def remove_first_object(self, x: int, y: int):
-        if len(self.location_map[x][y]) == 1:
+        index = self._cell_index(x, y)
+        stack = self._overlay.get(index)
+        if not stack:
             return None
-        removed_obj = self.location_map[x][y].pop(0)
-        await self.notify_observers({
-            self.map_id: {f"{x},{y}": self.location_map[x][y][0].name}
-        })
+        removed_obj = stack.pop(0)
+        if not stack:
+            del self._overlay[index]
+        self._unindex(removed_obj, x, y)
+        self._dirty_cells.add(index)
         return removed_obj
 
     async def remove_object_by_id(self, x, y, item_id: uuid.UUID):
-        objects = self.location_map[x][y]
-        for item in objects:
-            if item.id == item_id:
-                self.location_map[x][y].remove(item)
-        await self.notify_observers({
-            self.map_id: {f"{x},{y}": self.location_map[x][y][0].name}
-        })
+        index = self._cell_index(x, y)
+        stack = self._overlay.get(index)
+        if stack:
+            for item in stack:
+                if item.id == item_id:
+                    self._unindex(item, x, y)
+            stack[:] = [item for item in stack if item.id != item_id]
+            if not stack:
+                del self._overlay[index]
+        self._dirty_cells.add(index)
 
     async def place_object(self, object_type, x, y):
         await self.place_objects([object_type], x, y)
 
     async def place_objects(self, objects: list, x, y):
+        index = self._cell_index(x, y)
         for obj in objects:
-            obj.set_position(x, y)
-        self.location_map[x][y][:0] = objects
-        await self.notify_observers({
-            self.map_id: {f"{x},{y}": self.location_map[x][y][0].name}
-        })
+            if not self._is_shared(obj):
+                obj.set_position(x, y)
+            self._index_object(obj, x, y)
+        self._overlay.setdefault(index, [])[:0] = objects
+        self._dirty_cells.add(index)
+
+    def place_bulk(self, cells: Sequence[int], kinds: Sequence[str]) -> list[DefaultObject]:
+        # Puts a new object of kinds[i] on top of the packed cell cells[i]. There is no diff for this: the version
+        # is bumped once and the delta history restarts, so observers and resuming clients take a keyframe.
+        size = self.__map_height * self.__map_width
+        width = self.__map_width
+        objects = []
+        for index, kind in zip(cells, kinds):
+            if not 0 <= index < size:
+                raise IndexError(f"cell {index} is out of the map")
+            obj = create_item(kind)
+            x, y = divmod(index, width)
+            if not obj.prototype.shared:
+                obj.set_position(x, y)
+                obj.set_world_map(self)
+                self._index.insert(obj, x, y)
+            self._overlay.setdefault(index, []).insert(0, obj)
+            objects.append(obj)
+        self.version += 1
+        self._history.reset(self.version)
+        return objects
 
     async def replace_object(self, object_type: DefaultObject, x, y, position=0):
         if not object_type.is_solid():
+            index = self._cell_index(x, y)
+            stack = self._overlay.setdefault(index, [])
             if type(object_type) is Corpse:
-                self.location_map[x][y].pop(0)
-                self.location_map[x][y].insert(-1, object_type)
+                if stack:
+                    self._unindex(stack.pop(0), x, y)
+                # The corpse goes to the bottom of the stack, right above the terrain.
+                stack.append(object_type)
+                self._index_object(object_type, x, y)
+            elif position < len(stack):
+                self._unindex(stack[position], x, y)
+                stack[position] = object_type
+                self._index_object(object_type, x, y)
             else:
-                self.location_map[x][y][position] = object_type
-            await self.notify_observers({
-                self.map_id: {f"{x},{y}": self.location_map[x][y][0].name}
-            })
+                self._terrain[index] = self._terrain_code(object_type)
+            if not stack:
+                del self._overlay[index]
+            self._dirty_cells.add(index)
 
     async def move_player(self, player, old_x, old_y, new_x, new_y):
-        self.location_map[new_x][new_y].insert(0, player)
-        self.location_map[old_x][old_y].pop(0)
-        await self.notify_observers({
-            self.map_id: {f"{old_x},{old_y}": self.location_map[old_x][old_y][0].name,
-                          f"{new_x},{new_y}": player.name}
-        })
+        new_index = self._cell_index(new_x, new_y)
+        old_index = self._cell_index(old_x, old_y)
+        self._overlay.setdefault(new_index, []).insert(0, player)
+        old_stack = self._overlay[old_index]
+        old_stack.pop(0)
+        if not old_stack:
+            del self._overlay[old_index]
+        self._index.move(player, old_x, old_y, new_x, new_y)
+        self._dirty_cells.add(old_index)
+        self._dirty_cells.add(new_index)
+
+    async def flush_updates(self):
+        if not self._dirty_cells:
+            return
+        dirty_cells, self._dirty_cells = self._dirty_cells, set()
+        cells = {}
+        for index in sorted(dirty_cells):
+            x, y = divmod(index, self.__map_width)
+            stack = self._overlay.get(index)
+            cells[f"{x},{y}"] = (stack[0] if stack else self._terrain_palette[self._terrain[index]]).name
+        self.version += 1
+        self._history.append(self.version, cells)
+        await self.notify_observers({self.map_id: {"seq": self.version, "cells": cells}})
+
+    def _cell_index(self, x: int, y: int) -> int:
+        # Negative coordinates wrap around and anything past the edge raises IndexError, as nested lists did.
+        if x < 0:
+            x += self.__map_height
+        if y < 0:
+            y += self.__map_width
+        if not (0 <= x < self.__map_height and 0 <= y < self.__map_width):
+            raise IndexError(f"cell {x},{y} is out of the map")
+        return x * self.__map_width + y
+
+    def _terrain_code(self, terrain: DefaultObject) -> int:
+        for code, palette_terrain in enumerate(self._terrain_palette):
+            if palette_terrain is terrain:
+                return code
+        self._terrain_palette.append(terrain)
+        return len(self._terrain_palette) - 1
+
+    @staticmethod
+    def _is_shared(obj) -> bool:
+        # One flyweight instance stands on many cells, so it has no position or world of its own.
+        return isinstance(obj, DefaultObject) and obj.prototype.shared
+
+    def _index_object(self, obj, x: int, y: int):
+        if not self._is_shared(obj):
+            self._index.insert(obj, x, y)
+
+    def _unindex(self, obj, x: int, y: int):
+        if not self._is_shared(obj):
+            self._index.remove(obj, x, y)
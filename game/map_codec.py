@@ -0,0 +1,174 @@
+import struct
+import sys
+from array import array
+
+from game.map import Map
+
+# Binary full map layout (little-endian):
+#   header       <4sBBIIQ  magic "NPCM", format version, flags, height, width, map sequence number
+#   location_id  <H + utf-8
+#   palette      <H count, then <H + utf-8 per tile name
+#   surface      top object of every cell as palette indices, row-major;
+#                with FLAG_RLE: <I run count, run lengths (u16), run palette indices
+#   stacks       <I count, then <IH cell index, depth and the palette indices of the whole stack, top first,
+#                for every cell holding more than one object above the terrain
+# Palette indices are u8, or u16 when FLAG_WIDE_INDICES is set.
+#
+# Large payloads are split into chunk messages, each prefixed with <4sBHHI: magic "NPCC", format version,
+# chunk index, chunk count and the total payload length. Clients concatenate the chunks in index order.
+FULL_MAP_MAGIC = b"NPCM"
+CHUNK_MAGIC = b"NPCC"
+FORMAT_VERSION = 2
+FLAG_RLE = 0b01
+FLAG_WIDE_INDICES = 0b10
+BINARY_KEY_SUFFIX = ":bin"
+
+_HEADER = struct.Struct("<4sBBIIQ")
+_CHUNK_HEADER = struct.Struct("<4sBHHI")
+_MAX_RUN = 0xFFFF
+
+
+class EncodedChunks(tuple):
+    pass
+
+
+def encode_full_map(world: Map, rle: bool = False) -> bytes:
+    height, width = world.get_map_size()
+    palette: dict[str, int] = {}
+
+    def get_code(name: str) -> int:
+        code = palette.get(name)
+        if code is None:
+            code = palette[name] = len(palette)
+        return code
+
+    terrain, terrain_palette = world.get_terrain_layer()
+    terrain_codes = [get_code(terrain_object.name) for terrain_object in terrain_palette]
+    surface = [terrain_codes[code] for code in terrain]
+    stacks = []
+    for index, stack in world.get_overlay_cells():
+        surface[index] = get_code(stack[0].name)
+        if len(stack) > 1:
+            terrain_name = terrain_palette[terrain[index]].name
+            stacks.append((index, [get_code(obj.name) for obj in stack] + [get_code(terrain_name)]))
+
+    flags = FLAG_RLE if rle else 0
+    index_type = "B"
+    if len(palette) > 0xFF:
+        flags |= FLAG_WIDE_INDICES
+        index_type = "H"
+
+    location_id = world.map_id.encode("utf-8")
+    parts = [_HEADER.pack(FULL_MAP_MAGIC, FORMAT_VERSION, flags, height, width, world.version),
+             struct.pack("<H", len(location_id)), location_id,
+             struct.pack("<H", len(palette))]
+    for name in palette:
+        encoded_name = name.encode("utf-8")
+        parts += [struct.pack("<H", len(encoded_name)), encoded_name]
+
+    if rle:
+        run_lengths, run_codes = _run_length_encode(surface)
+        parts += [struct.pack("<I", len(run_codes)), _to_bytes(array("H", run_lengths)),
+                  _to_bytes(array(index_type, run_codes))]
+    else:
+        parts.append(_to_bytes(array(index_type, surface)))
+
+    parts.append(struct.pack("<I", len(stacks)))
+    for index, codes in stacks:
+        parts += [struct.pack("<IH", index, len(codes)), _to_bytes(array(index_type, codes))]
+    return b"".join(parts)
+
+
+def decode_full_map(payload: bytes) -> dict:
+    magic, version, flags, height, width, seq = _HEADER.unpack_from(payload, 0)
+    if magic != FULL_MAP_MAGIC or version != FORMAT_VERSION:
+        raise ValueError("Unsupported full map payload")
+    offset = _HEADER.size
+    location_id, offset = _read_string(payload, offset)
+    (palette_size,), offset = struct.unpack_from("<H", payload, offset), offset + 2
+    palette = []
+    for _ in range(palette_size):
+        name, offset = _read_string(payload, offset)
+        palette.append(name)
+
+    index_type = "H" if flags & FLAG_WIDE_INDICES else "B"
+    if flags & FLAG_RLE:
+        (runs,), offset = struct.unpack_from("<I", payload, offset), offset + 4
+        run_lengths, offset = _read_array(payload, offset, "H", runs)
+        run_codes, offset = _read_array(payload, offset, index_type, runs)
+        surface = [code for length, code in zip(run_lengths, run_codes) for _ in range(length)]
+    else:
+        surface, offset = _read_array(payload, offset, index_type, height * width)
+
+    (stack_count,), offset = struct.unpack_from("<I", payload, offset), offset + 4
+    stacks = {}
+    for _ in range(stack_count):
+        index, depth = struct.unpack_from("<IH", payload, offset)
+        codes, offset = _read_array(payload, offset + 6, index_type, depth)
+        stacks[f"{index // width},{index % width}"] = [palette[code] for code in codes]
+
+    return {
+        "location_id": location_id,
+        "seq": seq,
+        "location_size": (height, width),
+        "location_data": {f"{index // width},{index % width}": palette[code] for index, code in enumerate(surface)},
+        "location_stacks": stacks,
+    }
+
+
+def split_into_chunks(payload: bytes, chunk_size: int) -> EncodedChunks:
+    body_size = chunk_size - _CHUNK_HEADER.size
+    if body_size <= 0:
+        raise ValueError(f"Chunk size must be greater than {_CHUNK_HEADER.size} bytes")
+    bodies = [payload[start:start + body_size] for start in range(0, len(payload), body_size)] or [b""]
+    return EncodedChunks(
+        _CHUNK_HEADER.pack(CHUNK_MAGIC, FORMAT_VERSION, index, len(bodies), len(payload)) + body
+        for index, body in enumerate(bodies)
+    )
+
+
+def join_chunks(chunks) -> bytes:
+    bodies = {}
+    total_length = 0
+    for chunk in chunks:
+        magic, version, index, count, total_length = _CHUNK_HEADER.unpack_from(chunk, 0)
+        if magic != CHUNK_MAGIC or version != FORMAT_VERSION:
+            raise ValueError("Unsupported full map chunk")
+        bodies[index] = chunk[_CHUNK_HEADER.size:]
+    payload = b"".join(bodies[index] for index in sorted(bodies))
+    if len(payload) != total_length:
+        raise ValueError("Full map chunks are incomplete")
+    return payload
+
+
+def _run_length_encode(codes: list[int]) -> tuple[list[int], list[int]]:
+    run_lengths = []
+    run_codes = []
+    for code in codes:
+        if run_codes and run_codes[-1] == code and run_lengths[-1] < _MAX_RUN:
+            run_lengths[-1] += 1
+        else:
+            run_lengths.append(1)
+            run_codes.append(code)
+    return run_lengths, run_codes
+
+
+def _to_bytes(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+
+def _read_string(payload: bytes, offset: int) -> tuple[str, int]:
+    (length,) = struct.unpack_from("<H", payload, offset)
+    start = offset + 2
+    return payload[start:start + length].decode("utf-8"), start + length
+
+
+def _read_array(payload: bytes, offset: int, type_code: str, count: int) -> tuple[array, int]:
+    values = array(type_code)
+    end = offset + values.itemsize * count
+    values.frombytes(payload[offset:end])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values, end
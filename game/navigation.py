@@ -0,0 +1,270 @@
+import heapq
+import weakref
+from array import array
+from collections import deque
+from typing import Iterator
+
+from game.game_observer import GameObjectObserver
+from game.item.def_object import DefaultObject
+from game.map import Map
+
+Cell = tuple[int, int]
+UNREACHABLE = 0xFFFFFFFF
+# Distance fields take one u32 per cell and are rebuilt or repaired in the tick, at about 2 us per cell: a rebuild,
+# or removing the only item of a kind nearby, has to fit the tick budget. Maps larger than this fall back to
+# searching the spatial index.
+MAX_FIELD_CELLS = 1 << 16
+_NEIGHBOURS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+# Cached passability of the cells of a distance field map.
+_UNKNOWN, _PASSABLE, _BLOCKED = 0, 1, 2
+
+
+def is_passable(world: Map, x: int, y: int, avoid_players: bool = False) -> bool:
+    # Players stand on cells only for a moment, so by default they do not block: the first other object decides.
+    if not world.in_bounds(x, y):
+        return False
+    for obj in world.get_objects(x, y):
+        if not isinstance(obj, DefaultObject):
+            if avoid_players:
+                return False
+            continue
+        return not obj.is_solid()
+    return True
+
+
+def find_path(world: Map, start: Cell, goal: Cell, max_nodes: int = 20000,
+              avoid_players: bool = False) -> list[Cell] | None:
+    # A* over the four move directions. Returns the cells to step on, start excluded, or None when the goal cannot
+    # be reached within max_nodes expanded cells.
+    if start == goal:
+        return []
+    if not is_passable(world, *goal, avoid_players=avoid_players):
+        return None
+    goal_x, goal_y = goal
+    came_from: dict[Cell, Cell] = {}
+    costs: dict[Cell, int] = {start: 0}
+    frontier = [(abs(start[0] - goal_x) + abs(start[1] - goal_y), 0, start)]
+    expanded = 0
+    while frontier and expanded < max_nodes:
+        _, cost, cell = heapq.heappop(frontier)
+        if cell == goal:
+            path = [cell]
+            while path[-1] in came_from and came_from[path[-1]] != start:
+                path.append(came_from[path[-1]])
+            path.reverse()
+            return path
+        if cost > costs[cell]:
+            continue
+        expanded += 1
+        for dx, dy in _NEIGHBOURS:
+            neighbour = (cell[0] + dx, cell[1] + dy)
+            if cost + 1 >= costs.get(neighbour, UNREACHABLE):
+                continue
+            if not is_passable(world, *neighbour, avoid_players=avoid_players):
+                continue
+            costs[neighbour] = cost + 1
+            came_from[neighbour] = cell
+            heuristic = abs(neighbour[0] - goal_x) + abs(neighbour[1] - goal_y)
+            heapq.heappush(frontier, (cost + 1 + heuristic, cost + 1, neighbour))
+    return None
+
+
+class _DistanceField:
+    __slots__ = ("distances", "sources", "stale")
+
+    def __init__(self, cells: int):
+        self.distances = array("I", [UNREACHABLE]) * cells
+        self.sources: set[int] = set()
+        self.stale = True
+
+
+# Multi-source BFS distance fields of one map, one per item kind: the distance of every cell to the nearest
+# collectable item of that kind, so a step towards it is a lookup of the neighbours. The cache observes the map and
+# repairs the fields cell by cell: a new item or a cell that opens only lowers distances and is merged in with a BFS
+# from its cell. A removed item or a cell that becomes solid can only raise them: the cells whose distance led
+# through it are reset and filled again from the unchanged cells around them, so the work is bounded by the area
+# that cell served rather than the map. A gap in the delta sequence numbers (e.g. a place_bulk, which sends no diff)
+# marks every field stale, to be rebuilt on the next query.
+class DistanceFields(GameObjectObserver):
+    def __init__(self, world: Map):
+        # The map holds this cache as an observer and the module dictionary is keyed by the map, so a strong
+        # reference back would keep the map alive forever.
+        self._world = weakref.proxy(world)
+        self._height, self._width = world.get_map_size()
+        self._fields: dict[str, _DistanceField] = {}
+        self._passable = bytearray(self._height * self._width)
+        self._version = world.version
+
+    def get_distance(self, kind: str, x: int, y: int) -> int:
+        return self._get_field(kind).distances[x * self._width + y]
+
+    def step_towards(self, kind: str, x: int, y: int) -> Cell | None:
+        # Direction of a neighbour one step closer to the nearest item of kind, None when there is none reachable.
+        field = self._get_field(kind)
+        distance = field.distances[x * self._width + y]
+        if distance == UNREACHABLE or distance == 0:
+            return None
+        for dx, dy in _NEIGHBOURS:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < self._height and 0 <= ny < self._width and \
+                    field.distances[nx * self._width + ny] == distance - 1:
+                return dx, dy
+        return None
+
+    async def update(self, data):
+        for delta in data.values():
+            if delta["seq"] != self._version + 1:
+                self._invalidate()
+                return
+            self._version = delta["seq"]
+            for cell in delta["cells"]:
+                x, y = (int(value) for value in cell.split(","))
+                self._on_cell_changed(x, y)
+
+    def _on_cell_changed(self, x: int, y: int):
+        index = x * self._width + y
+        was_passable = self._passable[index]
+        self._passable[index] = _UNKNOWN
+        passable = self._is_passable(index)
+        opened = passable and was_passable == _BLOCKED
+        kinds = set(self._cell_kinds(x, y))
+        for kind, field in self._fields.items():
+            if field.stale:
+                continue
+            distances = field.distances
+            was_source = index in field.sources
+            if kind in kinds:
+                field.sources.add(index)
+                if distances[index] != 0:
+                    distances[index] = 0
+                    self._spread(field, [index])
+                continue
+            field.sources.discard(index)
+            if distances[index] != UNREACHABLE and (was_source or not passable):
+                self._raise(field, index)
+            elif opened:
+                nearest = min((distances[n] for n in self._neighbours(index)), default=UNREACHABLE)
+                if nearest != UNREACHABLE and nearest + 1 < distances[index]:
+                    distances[index] = nearest + 1
+                    self._spread(field, [index])
+
+    def _raise(self, field: _DistanceField, index: int):
+        # The cell no longer gives the distance it had. Its dependents are the cells one step further that have no
+        # other neighbour one step closer; going outwards level by level, a neighbour one step closer counts only
+        # when it is not a dependent itself. They are reset and filled again from the cells around them.
+        distances = field.distances
+        if not field.sources:
+            field.distances = array("I", [UNREACHABLE]) * len(distances)
+            return
+        sources = field.sources
+        # Dependents, and then the border cells already queued to fill them from.
+        orphaned = bytearray(len(distances))
+        orphaned[index] = 1
+        orphans = [index]
+        for cell in orphans:
+            distance = distances[cell]
+            for neighbour in self._neighbours(cell):
+                if orphaned[neighbour] or distances[neighbour] != distance + 1 or neighbour in sources:
+                    continue
+                for other in self._neighbours(neighbour):
+                    if distances[other] == distance and not orphaned[other]:
+                        break
+                else:
+                    orphaned[neighbour] = 1
+                    orphans.append(neighbour)
+        border = []
+        for cell in orphans:
+            distances[cell] = UNREACHABLE
+        for cell in orphans:
+            for neighbour in self._neighbours(cell):
+                if not orphaned[neighbour] and distances[neighbour] != UNREACHABLE:
+                    orphaned[neighbour] = 1
+                    border.append(neighbour)
+        self._spread(field, border)
+
+    def _invalidate(self):
+        for field in self._fields.values():
+            field.stale = True
+        self._passable = bytearray(self._height * self._width)
+        self._version = self._world.version
+
+    def _get_field(self, kind: str) -> _DistanceField:
+        if self._world.version != self._version:
+            # Changed without a delta yet, e.g. by place_bulk.
+            self._invalidate()
+        field = self._fields.get(kind)
+        if field is None:
+            field = self._fields[kind] = _DistanceField(self._height * self._width)
+        if field.stale:
+            self._rebuild(kind, field)
+        return field
+
+    def _rebuild(self, kind: str, field: _DistanceField):
+        field.distances = array("I", [UNREACHABLE]) * (self._height * self._width)
+        field.sources = set()
+        for item in self._world.get_index().query_rect(0, 0, self._height - 1, self._width - 1):
+            if isinstance(item, DefaultObject) and item.prototype.kind == kind and item.is_collectable():
+                field.sources.add(item.pos_x * self._width + item.pos_y)
+        for index in field.sources:
+            field.distances[index] = 0
+        self._spread(field, list(field.sources))
+        field.stale = False
+
+    def _spread(self, field: _DistanceField, seeds: list[int]):
+        # BFS out of cells whose distances are already set. The seeds are taken in order of their distance and
+        # merged with the queue, so every cell is reached first along a shortest path.
+        distances = field.distances
+        seeds.sort(key=distances.__getitem__)
+        queue = deque()
+        next_seed = 0
+        while queue or next_seed < len(seeds):
+            if queue and (next_seed == len(seeds) or distances[queue[0]] <= distances[seeds[next_seed]]):
+                index = queue.popleft()
+            else:
+                index = seeds[next_seed]
+                next_seed += 1
+            next_distance = distances[index] + 1
+            for neighbour in self._neighbours(index):
+                if distances[neighbour] > next_distance and self._is_passable(neighbour):
+                    distances[neighbour] = next_distance
+                    queue.append(neighbour)
+
+    def _neighbours(self, index: int) -> list[int]:
+        width = self._width
+        y = index % width
+        neighbours = []
+        if index >= width:
+            neighbours.append(index - width)
+        if index + width < self._height * width:
+            neighbours.append(index + width)
+        if y > 0:
+            neighbours.append(index - 1)
+        if y < width - 1:
+            neighbours.append(index + 1)
+        return neighbours
+
+    def _is_passable(self, index: int) -> bool:
+        passable = self._passable[index]
+        if passable == _UNKNOWN:
+            passable = _PASSABLE if is_passable(self._world, *divmod(index, self._width)) else _BLOCKED
+            self._passable[index] = passable
+        return passable == _PASSABLE
+
+    def _cell_kinds(self, x: int, y: int) -> Iterator[str]:
+        for obj in self._world.get_objects(x, y):
+            if isinstance(obj, DefaultObject) and obj.is_collectable():
+                yield obj.prototype.kind
+
+
+_distance_fields: weakref.WeakKeyDictionary[Map, DistanceFields] = weakref.WeakKeyDictionary()
+
+
+def get_distance_fields(world: Map) -> DistanceFields | None:
+    height, width = world.get_map_size()
+    if height * width > MAX_FIELD_CELLS:
+        return None
+    fields = _distance_fields.get(world)
+    if fields is None:
+        fields = _distance_fields[world] = DistanceFields(world)
+        world.add_observer(fields)
+    return fields
@@ -0,0 +1,160 @@
+import struct
+import weakref
+from typing import Sequence
+
+from errors.errors import ObservationsNotAvailableError
+from game.game_observer import GameObjectObserver
+from game.item.def_object import DefaultObject
+from game.item.registry import ITEM_TYPES
+from game.map import Map
+from game.player import Player
+
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:
+    np = None
+
+# Channels of an observation window. Tiles and items hold kind codes (KIND_CODES, 0 for none and for the cells
+# outside the map), the players channel the number of players standing on the cell, the observer included.
+TERRAIN_CHANNEL = 0
+ITEM_CHANNEL = 1
+PLAYER_CHANNEL = 2
+CHANNELS = 3
+KIND_CODES: dict[str, int] = {kind: code for code, kind in enumerate(ITEM_TYPES, start=1)}
+VITALS = ("health", "energy", "hungry", "pos_x", "pos_y", "direction_x", "direction_y", "attack_modifier",
+          "attack_damage", "defence", "inventory_size", "is_dead", "is_sleep")
+
+# Observation batch layout (little-endian):
+#   header    <4sBQHBBB  magic "NPCO", format version, map sequence number, player count, window, channel count
+#                        and vitals count
+#   user ids  <H + utf-8 per player, in the order of the records
+#   records   per player: the CHANNELS x window x window u8 view, row-major, then the vitals as f32
+OBSERVATIONS_MAGIC = b"NPCO"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<4sBQHBBB")
+
+
+def get_observation_dtype(window: int):
+    return np.dtype([("view", np.uint8, (CHANNELS, window, window)), ("vitals", np.float32, (len(VITALS),))])
+
+
+# Dense uint8 layers of one map, CHANNELS x height x width padded with empty cells on every side, so any window
+# around a cell of the map is a plain slice. The terrain channel is converted from the terrain layer in one go; the
+# overlay is read once on build and then kept up to date from the map deltas. A version gap (place_bulk does not
+# send a diff) rebuilds the layers on the next read.
+class ObservationLayers(GameObjectObserver):
+    def __init__(self, world: Map, padding: int):
+        # The map holds this cache as an observer and the module dictionary is keyed by the map, so a strong
+        # reference back would keep the map alive forever.
+        self._world = weakref.proxy(world)
+        self.padding = padding
+        self._grid = None
+        self._version = None
+
+    def get_grid(self):
+        if self._grid is None or self._world.version != self._version:
+            self._rebuild()
+        return self._grid
+
+    async def update(self, data):
+        if self._grid is None:
+            return
+        for delta in data.values():
+            if delta["seq"] != self._version + 1:
+                self._grid = None
+                return
+            self._version = delta["seq"]
+            for cell in delta["cells"]:
+                x, y = (int(value) for value in cell.split(","))
+                self._set_cell(x, y, self._world.get_objects(x, y))
+
+    def _rebuild(self):
+        height, width = self._world.get_map_size()
+        padding = self.padding
+        grid = np.zeros((CHANNELS, height + 2 * padding, width + 2 * padding), dtype=np.uint8)
+        terrain, palette = self._world.get_terrain_layer()
+        terrain_codes = np.array([KIND_CODES[terrain_object.prototype.kind] for terrain_object in palette],
+                                 dtype=np.uint8)
+        terrain_layer = np.frombuffer(terrain, dtype=np.uint16).reshape(height, width)
+        grid[TERRAIN_CHANNEL, padding:padding + height, padding:padding + width] = terrain_codes[terrain_layer]
+        self._grid = grid
+        self._version = self._world.version
+        # Only the occupied cells of the sparse overlay are visited.
+        for index in [index for index, _ in self._world.get_overlay_cells()]:
+            x, y = divmod(index, width)
+            self._set_cell(x, y, self._world.get_objects(x, y))
+
+    def _set_cell(self, x: int, y: int, objects: list):
+        # objects as get_objects returns them, the terrain last.
+        x += self.padding
+        y += self.padding
+        *stack, terrain = objects
+        item_code = 0
+        players = 0
+        for obj in stack:
+            if isinstance(obj, Player):
+                players += 1
+            elif not item_code and isinstance(obj, DefaultObject):
+                item_code = KIND_CODES[obj.prototype.kind]
+        self._grid[:, x, y] = (KIND_CODES[terrain.prototype.kind], item_code, min(players, 0xFF))
+
+
+_observation_layers: weakref.WeakKeyDictionary[Map, ObservationLayers] = weakref.WeakKeyDictionary()
+
+
+def get_observation_layers(world: Map, padding: int) -> ObservationLayers:
+    layers = _observation_layers.get(world)
+    if layers is None or layers.padding < padding:
+        if layers is not None:
+            world.remove_observer(layers)
+        layers = _observation_layers[world] = ObservationLayers(world, padding)
+        world.add_observer(layers)
+    return layers
+
+
+def create_observations(count: int, window: int):
+    # count zeroed records.
+    if np is None:
+        raise ObservationsNotAvailableError("numpy")
+    return np.zeros(count, dtype=get_observation_dtype(window))
+
+
+def build_observations(world: Map, players: Sequence[Player], window: int):
+    # One record per player: the window x window view centred on the player (window is odd) and the vitals.
+    if np is None:
+        raise ObservationsNotAvailableError("numpy")
+    if window % 2 == 0:
+        raise ValueError(f"window must be odd, got {window}")
+    layers = get_observation_layers(world, window // 2)
+    grid = layers.get_grid()
+    offset = layers.padding - window // 2
+    observations = create_observations(len(players), window)
+    if not players:
+        return observations
+    windows = sliding_window_view(grid, (window, window), axis=(1, 2))
+    xs = np.fromiter((player.pos_x + offset for player in players), dtype=np.intp, count=len(players))
+    ys = np.fromiter((player.pos_y + offset for player in players), dtype=np.intp, count=len(players))
+    observations["view"] = windows[:, xs, ys].transpose(1, 0, 2, 3)
+    observations["vitals"] = [_get_vitals(player) for player in players]
+    return observations
+
+
+def _get_vitals(player: Player) -> tuple:
+    parameters = player.get_player_parameters()
+    direction_x, direction_y = parameters["direction"]
+    return (parameters["health"], parameters["energy"], parameters["hungry"], *parameters["position"],
+            direction_x, direction_y, parameters["attack_modifier"], parameters["attack_damage"],
+            parameters["defence"], len(parameters["inventory"]), parameters["is_dead"], parameters["is_sleep"])
+
+
+def encode_observations(world: Map, user_ids: Sequence[str], observations) -> bytes:
+    window = observations.dtype["view"].shape[-1]
+    parts = [_HEADER.pack(OBSERVATIONS_MAGIC, FORMAT_VERSION, world.version, len(user_ids), window, CHANNELS,
+                          len(VITALS))]
+    for user_id in user_ids:
+        encoded = user_id.encode("utf-8")
+        parts.append(struct.pack("<H", len(encoded)))
+        parts.append(encoded)
+    parts.append(observations.tobytes())
+    return b"".join(parts)
@@ -1,26 +1,59 @@
 import inspect
 import random
+import time
+from collections import deque
 
 from errors.action_errors import IncorrectActionValues
 from game.item.corpse import Corpse
 from game.map import Map
 from game.item.def_object import DefaultObject
 from game.game_observer import GameObjectObserver
+from game.navigation import find_path, get_distance_fields
 from config.settings import settings
+from metrics.game_metrics import ACTION_SECONDS
 
 DEFAULT_ACTION = "do_nothing"
 
 
 class Player:
+    __slots__ = (
+        "user_id",
+        "char_id",
+        "stats_id",
+        "name",
+        "pos_x",
+        "pos_y",
+        "health",
+        "energy",
+        "hungry",
+        "world",
+        "direction",
+        "inventory",
+        "is_dead",
+        "defence",
+        "attack_modifier",
+        "attack_damage",
+        "skip_counter",
+        "observers",
+        "is_sleep",
+        "route",
+        "route_goal",
+    )
     __GAME_TICK = settings.game.tick
     __MAX_HEALTH = settings.player.max_health
     __MAX_ENERGY = settings.player.max_energy
     __MAX_HUNGRY = settings.player.max_hungry / __GAME_TICK
+    __PATH_MAX_NODES = settings.game.path_max_nodes
     __is_solid: bool = True
-    char_id: int = -1
+    # Players following a move_to route, advanced one step per tick by advance_routes.
+    _routed_players: dict["Player", None] = {}
+    _ROUTE_ACTIONS = ("move_to", "follow_route", "skip_turn")
 
     def __init__(self, user_id, name):
         self.user_id = user_id
+        self.char_id: int = -1
+        # Primary key of the CharStats row, -1 until known.
+        self.stats_id: int = -1
         self.name = name
         self.pos_x = 0
         self.pos_y = 0
@@ -35,14 +68,26 @@ class Player:
         self.attack_modifier = settings.player.default_attack_modifier
         self.attack_damage = settings.player.default_attack_damage
         self.skip_counter = 0
-        self.observers: set[GameObjectObserver] = set()
+        self.observers: tuple[GameObjectObserver, ...] = ()
         self.is_sleep: bool = False
+        self.route: deque[tuple[int, int]] | None = None
+        self.route_goal: tuple[int, int] | None = None
+
+    def is_solid(self):
+        return self.__is_solid
+
+    def is_collectable(self):
+        return False
+
+    def is_consumable(self):
+        return False
 
     def add_observer(self, observer: GameObjectObserver):
-        self.observers.add(observer)
+        if observer not in self.observers:
+            self.observers = (*self.observers, observer)
 
     def remove_observer(self, observer: GameObjectObserver):
-        self.observers.remove(observer)
+        self.observers = tuple(item for item in self.observers if item is not observer)
 
     def set_position(self, x, y):
         self.pos_x = x
@@ -141,8 +186,7 @@ class Player:
         for _ in range(steps):
             self.pos_x += direction[0]
             self.pos_y += direction[1]
-            if (self.pos_x < 0 or self.pos_y < 0 or
-                    self.pos_x > (self.world.get_map_size()[0] - 1) or (self.pos_y > self.world.get_map_size()[1] - 1)):
+            if not self.world.in_bounds(self.pos_x, self.pos_y):
                 self.pos_x -= direction[0]
                 self.pos_y -= direction[1]
                 break
@@ -223,6 +267,72 @@ class Player:
     async def do_nothing(self):
         await self.skip_turn()
 
+    async def move_to(self, x: int, y: int):
+        # Plans the route now, the steps are taken by follow_route on this and the following ticks.
+        path = find_path(self.world, (self.pos_x, self.pos_y), (int(x), int(y)), self.__PATH_MAX_NODES)
+        if not path:
+            self.stop_route()
+            return
+        self.route = deque(path)
+        self.route_goal = (int(x), int(y))
+        Player._routed_players[self] = None
+
+    async def follow_route(self):
+        if not self.route or self.energy <= 0:
+            self.stop_route()
+            return
+        next_x, next_y = self.route[0]
+        old_position = (self.pos_x, self.pos_y)
+        await self.move((next_x - self.pos_x, next_y - self.pos_y), 1)
+        if (self.pos_x, self.pos_y) == old_position:
+            # Something got in the way, most likely another player: plan around it.
+            path = find_path(self.world, old_position, self.route_goal, self.__PATH_MAX_NODES, avoid_players=True)
+            if not path:
+                self.stop_route()
+                return
+            self.route = deque(path)
+            return
+        self.route.popleft()
+        if not self.route:
+            self.stop_route()
+
+    async def step_to_nearest(self, kind: str):
+        # One step towards the nearest collectable item of kind. Next to it, the player turns to face the item, so a
+        # plain take_object picks it up.
+        fields = get_distance_fields(self.world)
+        if fields is None:
+            item = self.world.get_index().nearest(
+                self.pos_x, self.pos_y,
+                lambda entity: isinstance(entity, DefaultObject) and entity.prototype.kind == kind
+                and entity.is_collectable())
+            if item is None:
+                return
+            distance = abs(item.pos_x - self.pos_x) + abs(item.pos_y - self.pos_y)
+            path = find_path(self.world, (self.pos_x, self.pos_y), (item.pos_x, item.pos_y), self.__PATH_MAX_NODES)
+            direction = (path[0][0] - self.pos_x, path[0][1] - self.pos_y) if path else None
+        else:
+            distance = fields.get_distance(kind, self.pos_x, self.pos_y)
+            direction = fields.step_towards(kind, self.pos_x, self.pos_y)
+        if direction is None:
+            return
+        if distance == 1:
+            self.set_direction(*direction)
+            await self.notify_observers()
+            return
+        await self.move(direction, 1)
+
+    @classmethod
+    async def advance_routes(cls, worlds=None):
+        # Limited to the players on one of worlds when given, so games running side by side keep to their own.
+        for player in list(cls._routed_players):
+            if worlds is None or player.world in worlds:
+                await player.do_action({"action": "follow_route", "params": []})
+
+    def stop_route(self):
+        self.route = None
+        self.route_goal = None
+        Player._routed_players.pop(self, None)
+
     async def sleep(self):
         self.is_sleep = True
 
@@ -238,8 +348,11 @@ class Player:
         action_name = action.get("action", DEFAULT_ACTION)
         if action_name != "skip_turn":
             self.skip_counter = 0
+        if self.route is not None and action_name not in self._ROUTE_ACTIONS:
+            self.stop_route()
         method = getattr(self, action_name, DEFAULT_ACTION)
         if method is not None and callable(method):
+            started_at = time.perf_counter()
             try:
                 if inspect.iscoroutinefunction(method):
                     result = await method(*action.get("params", []))
@@ -249,6 +362,8 @@ class Player:
                 raise IncorrectActionValues(
                     message=f"action_name: {action.get(action_name)}, params: {action.get("params")}"
                 )
+            finally:
+                ACTION_SECONDS.labels(action_name).observe(time.perf_counter() - started_at)
         else:
             raise IncorrectActionValues(message=action_name)
         return result
@@ -279,7 +394,7 @@ class Player:
         for item in self.inventory:
             x = self.pos_x
             y = self.pos_y
-            while (x == self.pos_x and y == self.pos_y) or self.world.location_map[x][y][0].is_solid():
+            while (x == self.pos_x and y == self.pos_y) or self.world.get_first_object(x, y).is_solid():
                 x = self.pos_x + random.randint(0, 1)
                 y = self.pos_y + random.randint(0, 1)
             await self.world.place_object(item, x, y)
@@ -292,6 +407,23 @@ class Player:
         return f"Player: {self.name}"
 
     async def notify_observers(self):
-        data = {self.user_id: self.get_player_parameters()}
-        for observer in self.observers:
+        # Only marks the player dirty on its map: its parameters are built once per tick by flush_updates. A player
+        # without a map has nothing to send.
+        if self.world is not None:
+            self.world.mark_player_dirty(self)
+
+    @classmethod
+    async def flush_updates(cls, worlds) -> list["Player"]:
+        # The players marked dirty on worlds, the maps of one game, so games running side by side in one process
+        # never send or record each other's players. Returns the flushed players.
+        dirty_players = list(dict.fromkeys(player for world in worlds for player in world.take_dirty_players()))
+        batches: dict[GameObjectObserver, dict] = {}
+        for player in dirty_players:
+            if not player.observers or player.world is None:
+                continue
+            parameters = player.get_player_parameters()
+            for observer in player.observers:
+                batches.setdefault(observer, {})[player.user_id] = parameters
+        for observer, data in batches.items():
             await observer.update(data)
+        return dirty_players
@@ -44,6 +44,14 @@ class PlayerController:
         action = {"action": "attack", "params": [direction]}
         await self.__do_action(action)
 
+    async def move_to(self, target: tuple[int, int]):
+        action = {"action": "move_to", "params": [*target]}
+        await self.__do_action(action)
+
+    async def step_to_nearest(self, kind: str):
+        action = {"action": "step_to_nearest", "params": [kind]}
+        await self.__do_action(action)
+
     async def skip_turn(self):
         action = {"action": "skip_turn", "params": []}
         await self.__do_action(action)
@@ -64,6 +72,8 @@ class PlayerController:
 # Activities: {"action": "use_item", "params": [1]} - use item under index 1
 # Activities: {"action": "attack", "params": [(0,1)]} - attack in front of the player with power and damage
 # Activities: {"action": "skip_turn", "params": []} - skip turn and restore 1 energy
+# Activities: {"action": "move_to", "params": [10, 20]} - walk to cell 10,20, one step per tick
+# Activities: {"action": "step_to_nearest", "params": ["meat"]} - one step towards the nearest meat
 
 # (when the character is sleeping, his hunger does not decrease, but also cannot perform any actions).
 # Activities: {"action": "awake", "params": []} - The character can perform action after sleeping
@@ -1,7 +1,9 @@
 import asyncio
+import time
 from abc import ABC, abstractmethod
 
 from config.settings import settings
+from metrics.game_metrics import QUEUE_WAIT_SECONDS
 
 
 class DefaultBufferQueue(ABC):
@@ -14,33 +16,55 @@ class DefaultBufferQueue(ABC):
     async def drain_buffer(self) -> dict:
         pass
 
+    async def put_many(self, messages: list):
+        for message in messages:
+            await self.put(message)
+
 
 class BufferQueueWithLock(DefaultBufferQueue):
     def __init__(self):
         self._updates_buffer = {}
+        # (topic, perf_counter at put) of every message since the last drain, for the queue wait metric.
+        self._put_times: list[tuple[str, float]] = []
         self._lock = asyncio.Lock()
         self._location_updates_topic = settings.topic.location_update_kafka_topic
         self._player_updates_topic = settings.topic.player_update_kafka_topic
 
     async def put(self, message):
         async with self._lock:
-            topic = message.get("topic")
-            key = message.get("key")
-            if topic == self._location_updates_topic:
-                self._update_location_map(topic, key, message.get("value"))
-                return
-            self._updates_buffer.setdefault(topic, {})[key] = message.get("value")
+            self._put(message)
+
+    async def put_many(self, messages: list):
+        async with self._lock:
+            for message in messages:
+                self._put(message)
+
+    def _put(self, message):
+        topic = message.get("topic")
+        key = message.get("key")
+        self._put_times.append((topic, time.perf_counter()))
+        if topic == self._location_updates_topic:
+            self._update_location_map(topic, key, message.get("value"))
+            return
+        self._updates_buffer.setdefault(topic, {})[key] = message.get("value")
 
     async def drain_buffer(self) -> dict[str, str]:
         async with self._lock:
             snapshot = self._updates_buffer
             self._updates_buffer = {self._player_updates_topic: {}}
+            put_times, self._put_times = self._put_times, []
+        drained_at = time.perf_counter()
+        for topic, put_at in put_times:
+            QUEUE_WAIT_SECONDS.labels(topic).observe(drained_at - put_at)
         return snapshot
 
     def _update_location_map(self, topic, location_id, updates):
+        # Location updates are {"seq": map version, "cells": {...}}; diffs of one tick are merged and stamped with
+        # the latest sequence number. The cells dict is copied, the observer's one is also kept in the map history.
         buffer = self._updates_buffer.setdefault(topic, {})
         location = self._updates_buffer[topic].get(location_id)
         if location is None:
-            buffer[location_id] = updates
+            buffer[location_id] = {"seq": updates["seq"], "cells": dict(updates["cells"])}
         else:
-            location.update(updates)
+            location["cells"].update(updates["cells"])
+            location["seq"] = max(location["seq"], updates["seq"])
@@ -0,0 +1,78 @@
+import logging
+from collections import deque
+from typing import Awaitable, Callable
+
+
+# Per-player intent queues drained once per tick. Every queue is bounded: intents arriving at a full queue are
+# dropped and counted. run_tick applies at most intents_per_tick intents per player, going round-robin over the
+# players in user id order, so the outcome of a tick does not depend on the order its events arrived in.
+class IntentScheduler:
+    logger = logging.getLogger("game.scheduler")
+
+    def __init__(self, max_queue_size: int = 4, intents_per_tick: int = 1):
+        self._max_queue_size = max_queue_size
+        self._intents_per_tick = intents_per_tick
+        self._queues: dict[str, deque] = {}
+        self._dropped: dict[str, int] = {}
+        self._dropped_total = 0
+        self._reported_dropped = 0
+        self._handler: Callable[[str, object], Awaitable] | None = None
+
+    def set_handler(self, handler: Callable[[str, object], Awaitable]):
+        self._handler = handler
+
+    def submit(self, user_id: str, intent) -> bool:
+        queue = self._queues.setdefault(user_id, deque())
+        if len(queue) >= self._max_queue_size:
+            self._dropped[user_id] = self._dropped.get(user_id, 0) + 1
+            self._dropped_total += 1
+            return False
+        queue.append(intent)
+        return True
+
+    def remove(self, user_id: str):
+        self._queues.pop(user_id, None)
+        self._dropped.pop(user_id, None)
+
+    def get_queue_depth(self, user_id: str) -> int:
+        queue = self._queues.get(user_id)
+        return len(queue) if queue else 0
+
+    def get_dropped(self, user_id: str) -> int:
+        return self._dropped.get(user_id, 0)
+
+    def get_stats(self) -> dict[str, int]:
+        depths = [len(queue) for queue in self._queues.values()]
+        return {
+            "players": len(depths),
+            "queued": sum(depths),
+            "max_depth": max(depths, default=0),
+            "dropped": self._dropped_total,
+        }
+
+    async def run_tick(self) -> int:
+        if self._handler is None:
+            return 0
+        applied = 0
+        user_ids = sorted(user_id for user_id, queue in self._queues.items() if queue)
+        for _ in range(self._intents_per_tick):
+            if not user_ids:
+                break
+            for user_id in user_ids:
+                queue = self._queues.get(user_id)
+                if not queue:
+                    continue
+                intent = queue.popleft()
+                try:
+                    await self._handler(user_id, intent)
+                except Exception as err:
+                    self.logger.error(f"Intent of user {user_id} failed", exc_info=err)
+                applied += 1
+            user_ids = [user_id for user_id in user_ids if self._queues.get(user_id)]
+        for user_id in [user_id for user_id, queue in self._queues.items() if not queue]:
+            del self._queues[user_id]
+        if self._dropped_total > self._reported_dropped:
+            self.logger.warning(f"Dropped {self._dropped_total - self._reported_dropped} intents since the last "
+                                f"tick, stats: {self.get_stats()}")
+            self._reported_dropped = self._dropped_total
+        return applied
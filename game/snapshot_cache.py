@@ -0,0 +1,69 @@
+import json
+from dataclasses import dataclass, field
+from typing import Callable
+
+from game.game_observer import GameObjectObserver
+from game.location import Location
+from game.map import Map
+from game.map_codec import EncodedChunks, encode_full_map, split_into_chunks
+
+
+@dataclass(slots=True)
+class _MapSnapshot:
+    world: Map
+    cells: dict[str, str]
+    version: int
+    payload: bytes | None = None
+    payload_version: int = field(default=-1)
+
+
+# Per-location cache of the encoded get_full_map payload. It is registered as a map observer, so the cached cell
+# dict is patched from the same diffs that go to clients; the payload is re-encoded lazily, only when the
+# map version moved since the last encode. A version the cache did not see (e.g. it was not observing the map)
+# falls back to re-walking the grid.
+class MapSnapshotCache(GameObjectObserver):
+    def __init__(self, encoder: Callable[[dict], bytes] = None):
+        self._encoder = encoder or (lambda value: json.dumps(value).encode("utf-8"))
+        self._snapshots: dict[str, _MapSnapshot] = {}
+        self._chunks: dict[tuple[str, bool, int], tuple[int, EncodedChunks]] = {}
+
+    async def update(self, data):
+        for map_id, delta in data.items():
+            snapshot = self._snapshots.get(map_id)
+            if snapshot is None:
+                continue
+            snapshot.cells.update(delta["cells"])
+            # Every map version bump is published exactly once, so counting the diffs keeps us in step with it.
+            snapshot.version += 1
+
+    def get_full_map_payload(self, location: Location) -> bytes:
+        world = location.get_map()
+        snapshot = self._snapshots.get(world.map_id)
+        if snapshot is None or snapshot.version != world.version:
+            snapshot = self._snapshots[world.map_id] = _MapSnapshot(world, self._read_cells(world), world.version)
+        if snapshot.payload_version != snapshot.version:
+            snapshot.payload = self._encoder({
+                "location_id": world.map_id,
+                "seq": snapshot.version,
+                "location_size": location.get_location_size(),
+                "location_data": snapshot.cells,
+            })
+            snapshot.payload_version = snapshot.version
+        return snapshot.payload
+
+    def get_full_map_chunks(self, location: Location, chunk_size: int, rle: bool = False) -> EncodedChunks:
+        world = location.get_map()
+        key = (world.map_id, rle, chunk_size)
+        cached = self._chunks.get(key)
+        if cached is None or cached[0] != world.version:
+            cached = self._chunks[key] = (world.version, split_into_chunks(encode_full_map(world, rle), chunk_size))
+        return cached[1]
+
+    def invalidate(self, map_id: str):
+        self._snapshots.pop(map_id, None)
+        for key in [key for key in self._chunks if key[0] == map_id]:
+            del self._chunks[key]
+
+    @staticmethod
+    def _read_cells(world: Map) -> dict[str, str]:
+        return world.get_cells()
@@ -0,0 +1,88 @@
+from typing import Callable, Iterator
+
+
+# Spatial hash of the entities standing on a map. Cells are grouped into square buckets and every bucket keeps
+# its entities in insertion order, so queries only touch the buckets that overlap the searched area.
+class SpatialIndex:
+    def __init__(self, bucket_size: int = 8):
+        self._bucket_size = bucket_size
+        self._buckets: dict[tuple[int, int], dict[object, None]] = {}
+
+    def insert(self, entity, x: int, y: int):
+        self._buckets.setdefault(self._bucket(x, y), {})[entity] = None
+
+    def remove(self, entity, x: int, y: int):
+        key = self._bucket(x, y)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return
+        bucket.pop(entity, None)
+        if not bucket:
+            del self._buckets[key]
+
+    def move(self, entity, old_x: int, old_y: int, new_x: int, new_y: int):
+        if self._bucket(old_x, old_y) != self._bucket(new_x, new_y):
+            self.remove(entity, old_x, old_y)
+            self.insert(entity, new_x, new_y)
+
+    def query_rect(self, min_x: int, min_y: int, max_x: int, max_y: int) -> Iterator:
+        min_bx, min_by = self._bucket(min_x, min_y)
+        max_bx, max_by = self._bucket(max_x, max_y)
+        for bx in range(min_bx, max_bx + 1):
+            for by in range(min_by, max_by + 1):
+                bucket = self._buckets.get((bx, by))
+                if not bucket:
+                    continue
+                for entity in bucket:
+                    if min_x <= entity.pos_x <= max_x and min_y <= entity.pos_y <= max_y:
+                        yield entity
+
+    def query_radius(self, x: int, y: int, radius: int) -> Iterator:
+        radius_sq = radius * radius
+        for entity in self.query_rect(x - radius, y - radius, x + radius, y + radius):
+            if (entity.pos_x - x) ** 2 + (entity.pos_y - y) ** 2 <= radius_sq:
+                yield entity
+
+    def nearest(self, x: int, y: int, predicate: Callable[[object], bool] = None, max_radius: int = None):
+        if not self._buckets:
+            return None
+        center_bx, center_by = self._bucket(x, y)
+        if max_radius is None:
+            max_ring = max(max(abs(bx - center_bx), abs(by - center_by)) for bx, by in self._buckets)
+        else:
+            max_ring = max_radius // self._bucket_size + 1
+        best = None
+        best_distance = None
+        for ring in range(max_ring + 1):
+            # Anything in this ring or further out is at least (ring - 1) * bucket_size cells away.
+            if best is not None and ((ring - 1) * self._bucket_size) ** 2 > best_distance:
+                break
+            for bx, by in self._ring(center_bx, center_by, ring):
+                bucket = self._buckets.get((bx, by))
+                if not bucket:
+                    continue
+                for entity in bucket:
+                    if predicate is not None and not predicate(entity):
+                        continue
+                    distance = (entity.pos_x - x) ** 2 + (entity.pos_y - y) ** 2
+                    if max_radius is not None and distance > max_radius * max_radius:
+                        continue
+                    if best is None or distance < best_distance:
+                        best = entity
+                        best_distance = distance
+        return best
+
+    def _bucket(self, x: int, y: int) -> tuple[int, int]:
+        return x // self._bucket_size, y // self._bucket_size
+
+    @staticmethod
+    def _ring(center_x: int, center_y: int, ring: int) -> Iterator[tuple[int, int]]:
+        if ring == 0:
+            yield center_x, center_y
+            return
+        for dx in range(-ring, ring + 1):
+            yield center_x + dx, center_y - ring
+            yield center_x + dx, center_y + ring
+        for dy in range(-ring + 1, ring):
+            yield center_x - ring, center_y + dy
+            yield center_x + ring, center_y + dy
@@ -0,0 +1,388 @@
+import mmap
+import os
+import struct
+import uuid
+from array import array
+from dataclasses import dataclass
+
+from game.delta_history import MapDeltaHistory
+from game.item.corpse import Corpse
+from game.item.def_object import DefaultObject
+from game.item.registry import create_item, get_prototype
+from game.location import Location
+from game.map import Map
+from game.player import Player
+
+# World snapshot layout (little-endian):
+#   header      <4sBQI  magic "NPCW", format version, sequence number of the last tick it contains, location count
+#   main id     <H + utf-8 map_id of the main location
+#   locations   name, map_id, <QII version, height, width, terrain palette (<H count + item kinds), terrain codes
+#               (height * width u16), then <I count of overlay cells, each <I cell index followed by its stack
+#   players     <I count, then one player record each
+# A stack is <H depth + objects, top first. An object is <B tag: 0 item (kind, 16-byte uuid, <i hp, name,
+# corpse name), 1 player reference (user_id). Strings are <H length + utf-8.
+#
+# The log next to it holds one record per tick that changed something: <IQ payload length, tick sequence number,
+# then <H location count, each map_id, <Q version and <I cells given as <I index + the whole cell (stack and its
+# terrain), followed by <I count of player records. Replaying it redoes the effects of the applied actions, so
+# randomness in the actions does not matter.
+SNAPSHOT_MAGIC = b"NPCW"
+FORMAT_VERSION = 1
+SNAPSHOT_FILE = "world.snapshot"
+LOG_FILE = "world.log"
+
+_HEADER = struct.Struct("<4sBQI")
+_LOG_RECORD = struct.Struct("<IQ")
+_LOCATION = struct.Struct("<QII")
+_PLAYER = struct.Struct("<qiiiidbbiiiiB")
+_ITEM_TAG = 0
+_PLAYER_TAG = 1
+_DEAD = 0b001
+_SLEEP = 0b010
+_ONLINE = 0b100
+
+
+@dataclass
+class RestoredWorld:
+    locations: list[Location]
+    main_location_id: str
+    players: list[Player]
+    online_user_ids: set[str]
+
+
+class _Writer:
+    def __init__(self):
+        self.parts: list[bytes] = []
+
+    def pack(self, fmt: struct.Struct | str, *values):
+        self.parts.append(fmt.pack(*values) if isinstance(fmt, struct.Struct) else struct.pack(fmt, *values))
+
+    def string(self, value: str):
+        encoded = value.encode("utf-8")
+        self.parts += [struct.pack("<H", len(encoded)), encoded]
+
+    def raw(self, value: bytes):
+        self.parts.append(value)
+
+    def getvalue(self) -> bytes:
+        return b"".join(self.parts)
+
+
+class _Reader:
+    def __init__(self, buffer, offset: int = 0):
+        self.buffer = buffer
+        self.offset = offset
+
+    def unpack(self, fmt: struct.Struct | str) -> tuple:
+        fmt = fmt if isinstance(fmt, struct.Struct) else struct.Struct(fmt)
+        values = fmt.unpack_from(self.buffer, self.offset)
+        self.offset += fmt.size
+        return values
+
+    def string(self) -> str:
+        return self.raw(self.unpack("<H")[0]).decode("utf-8")
+
+    def raw(self, size: int) -> bytes:
+        value = bytes(self.buffer[self.offset:self.offset + size])
+        self.offset += size
+        return value
+
+
+# Keeps the game state in a directory: a compact binary snapshot written every snapshot_interval ticks (atomically,
+# through a temporary file) and an append-only log of the ticks since. restore() mmaps the snapshot and replays
+# the log records newer than it; a record cut short by a crash ends the replay.
+class WorldStore:
+    def __init__(self, directory: str, snapshot_interval: int = 600, fsync: bool = False):
+        self._directory = directory
+        self._snapshot_interval = snapshot_interval
+        self._fsync = fsync
+        self._seq = 0
+        self._ticks_since_snapshot = 0
+        self._log = None
+        self._items: dict[uuid.UUID, DefaultObject] = {}
+        self._players: dict[str, Player] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def restore(self) -> RestoredWorld | None:
+        path = os.path.join(self._directory, SNAPSHOT_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            world = self._read_snapshot(_Reader(buffer))
+        locations = {location.get_map().map_id: location for location in world.locations}
+        log_path = os.path.join(self._directory, LOG_FILE)
+        if os.path.exists(log_path) and os.path.getsize(log_path) > 0:
+            with open(log_path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                self._replay_log(buffer, locations, world)
+        self._items.clear()
+        self._players.clear()
+        return world
+
+    def record_tick(self, game, dirty_players: list[Player], dirty_cells: dict[str, set[int]]):
+        if dirty_players or any(dirty_cells.values()):
+            self._seq += 1
+            self._append_log(self._encode_tick(game, dirty_players, dirty_cells))
+        self._ticks_since_snapshot += 1
+        if self._ticks_since_snapshot >= self._snapshot_interval:
+            self.write_snapshot(game)
+
+    def write_snapshot(self, game):
+        writer = _Writer()
+        writer.pack(_HEADER, SNAPSHOT_MAGIC, FORMAT_VERSION, self._seq, len(game.locations))
+        writer.string(game.main_location.get_map().map_id if game.main_location else "")
+        players = []
+        for location in game.locations.values():
+            self._write_location(writer, location)
+            players += [entity for _, stack in location.get_map().get_overlay_cells()
+                        for entity in stack if isinstance(entity, Player)]
+        online = game.player_controllers
+        writer.pack("<I", len(players))
+        for player in players:
+            self._write_player(writer, player, player.user_id in online)
+
+        path = os.path.join(self._directory, SNAPSHOT_FILE)
+        with open(path + ".tmp", "wb") as file:
+            file.write(writer.getvalue())
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path + ".tmp", path)
+        # Everything logged so far is part of the snapshot now.
+        self.close()
+        self._log = open(os.path.join(self._directory, LOG_FILE), "wb")
+        self._ticks_since_snapshot = 0
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def _append_log(self, payload: bytes):
+        if self._log is None:
+            self._log = open(os.path.join(self._directory, LOG_FILE), "ab")
+        self._log.write(_LOG_RECORD.pack(len(payload), self._seq) + payload)
+        self._log.flush()
+        if self._fsync:
+            os.fsync(self._log.fileno())
+
+    def _encode_tick(self, game, dirty_players: list[Player], dirty_cells: dict[str, set[int]]) -> bytes:
+        writer = _Writer()
+        changed = [(map_id, cells) for map_id, cells in dirty_cells.items() if cells and map_id in game.locations]
+        writer.pack("<H", len(changed))
+        for map_id, cells in changed:
+            world = game.locations[map_id].get_map()
+            width = world.get_map_size()[1]
+            writer.string(map_id)
+            writer.pack("<QI", world.version, len(cells))
+            for index in sorted(cells):
+                writer.pack("<I", index)
+                self._write_stack(writer, world.get_objects(*divmod(index, width)))
+        players = [player for player in dirty_players if player.world is not None]
+        writer.pack("<I", len(players))
+        for player in players:
+            self._write_player(writer, player, player.user_id in game.player_controllers)
+        return writer.getvalue()
+
+    def _write_location(self, writer: _Writer, location: Location):
+        world = location.get_map()
+        height, width = world.get_map_size()
+        terrain, palette = world.get_terrain_layer()
+        writer.string(location.get_name())
+        writer.string(world.map_id)
+        writer.pack(_LOCATION, world.version, height, width)
+        writer.pack("<H", len(palette))
+        for terrain_object in palette:
+            writer.string(terrain_object.prototype.kind)
+        writer.raw(terrain.tobytes())
+        cells = list(world.get_overlay_cells())
+        writer.pack("<I", len(cells))
+        for index, stack in cells:
+            writer.pack("<I", index)
+            self._write_stack(writer, stack)
+
+    def _write_stack(self, writer: _Writer, stack: list):
+        writer.pack("<H", len(stack))
+        for obj in stack:
+            if isinstance(obj, Player):
+                writer.pack("<B", _PLAYER_TAG)
+                writer.string(obj.user_id)
+            else:
+                writer.pack("<B", _ITEM_TAG)
+                self._write_item(writer, obj)
+
+    @staticmethod
+    def _write_item(writer: _Writer, item: DefaultObject):
+        writer.string(item.prototype.kind)
+        writer.raw(item.id.bytes)
+        writer.pack("<i", item.hp)
+        writer.string(item.name)
+        writer.string(item.corpse_name if isinstance(item, Corpse) else "")
+
+    def _write_player(self, writer: _Writer, player: Player, online: bool):
+        writer.string(player.user_id)
+        writer.string(player.name)
+        writer.string(player.world.map_id if player.world else "")
+        flags = (_DEAD if player.is_dead else 0) | (_SLEEP if player.is_sleep else 0) | (_ONLINE if online else 0)
+        writer.pack(_PLAYER, player.char_id, player.pos_x, player.pos_y, player.health, player.energy,
+                    player.hungry, *player.direction, player.defence, player.attack_modifier, player.attack_damage,
+                    player.skip_counter, flags)
+        writer.pack("<H", len(player.inventory))
+        for item in player.inventory:
+            self._write_item(writer, item)
+
+    def _read_snapshot(self, reader: _Reader) -> RestoredWorld:
+        magic, version, seq, location_count = reader.unpack(_HEADER)
+        if magic != SNAPSHOT_MAGIC or version != FORMAT_VERSION:
+            raise ValueError("Unsupported world snapshot")
+        self._seq = seq
+        main_location_id = reader.string()
+        locations = [self._read_location(reader) for _ in range(location_count)]
+        maps = {location.get_map().map_id: location.get_map() for location in locations}
+        (player_count,) = reader.unpack("<I")
+        world = RestoredWorld(locations, main_location_id, [], set())
+        for _ in range(player_count):
+            self._read_player(reader, maps, world)
+        # Cells were read before the players, resolve the references now.
+        for location in locations:
+            self._resolve_players(location.get_map())
+        return world
+
+    def _read_location(self, reader: _Reader) -> Location:
+        name = reader.string()
+        map_id = reader.string()
+        version, height, width = reader.unpack(_LOCATION)
+        (palette_size,) = reader.unpack("<H")
+        palette = [create_item(reader.string()) for _ in range(palette_size)]
+        terrain = array("H")
+        terrain.frombytes(reader.raw(2 * height * width))
+        world = Map(height, width, palette[0], MapDeltaHistory())
+        world.load_terrain_layer(terrain, palette)
+        world.map_id = map_id
+        world.version = version
+        (cell_count,) = reader.unpack("<I")
+        for _ in range(cell_count):
+            (index,) = reader.unpack("<I")
+            stack = self._read_stack(reader, world)
+            terrain_object = palette[terrain[index]]
+            world.set_objects(*divmod(index, width), [*stack, terrain_object])
+        return Location(world, name)
+
+    def _read_stack(self, reader: _Reader, world: Map) -> list:
+        (depth,) = reader.unpack("<H")
+        stack = []
+        for _ in range(depth):
+            (tag,) = reader.unpack("<B")
+            if tag == _PLAYER_TAG:
+                user_id = reader.string()
+                # Players of the snapshot are read after the map: keep a placeholder until they are.
+                stack.append(self._players.get(user_id) or _PlayerReference(user_id))
+            else:
+                item = self._read_item(reader)
+                if not item.prototype.shared:
+                    item.set_world_map(world)
+                stack.append(item)
+        return stack
+
+    def _read_item(self, reader: _Reader) -> DefaultObject:
+        kind = reader.string()
+        item_id = uuid.UUID(bytes=reader.raw(16))
+        (hp,) = reader.unpack("<i")
+        name = reader.string()
+        corpse_name = reader.string()
+        if get_prototype(kind).shared:
+            return create_item(kind)
+        item = self._items.get(item_id)
+        if item is None:
+            item = self._items[item_id] = create_item(kind)
+            item.id = item_id
+        item.hp = hp
+        if item.name != name:
+            item.name = name
+        if isinstance(item, Corpse):
+            item.corpse_name = corpse_name
+        return item
+
+    def _read_player(self, reader: _Reader, maps: dict[str, Map], world: RestoredWorld):
+        user_id = reader.string()
+        name = reader.string()
+        map_id = reader.string()
+        (char_id, pos_x, pos_y, health, energy, hungry, direction_x, direction_y, defence, attack_modifier,
+         attack_damage, skip_counter, flags) = reader.unpack(_PLAYER)
+        player = self._players.get(user_id)
+        if player is None:
+            player = self._players[user_id] = Player(user_id, name)
+            world.players.append(player)
+        player.name = name
+        player.char_id = char_id
+        player.world = maps.get(map_id)
+        player.set_position(pos_x, pos_y)
+        player.health = health
+        player.energy = energy
+        player.hungry = hungry
+        player.direction = (direction_x, direction_y)
+        player.defence = defence
+        player.attack_modifier = attack_modifier
+        player.attack_damage = attack_damage
+        player.skip_counter = skip_counter
+        player.is_dead = bool(flags & _DEAD)
+        player.is_sleep = bool(flags & _SLEEP)
+        (inventory_size,) = reader.unpack("<H")
+        player.inventory = [self._read_item(reader) for _ in range(inventory_size)]
+        if flags & _ONLINE:
+            world.online_user_ids.add(user_id)
+        else:
+            world.online_user_ids.discard(user_id)
+
+    def _replay_log(self, buffer, locations: dict[str, Location], world: RestoredWorld):
+        maps = {map_id: location.get_map() for map_id, location in locations.items()}
+        offset = 0
+        while offset + _LOG_RECORD.size <= len(buffer):
+            size, seq = _LOG_RECORD.unpack_from(buffer, offset)
+            start = offset + _LOG_RECORD.size
+            if start + size > len(buffer):
+                break
+            offset = start + size
+            if seq <= self._seq:
+                continue
+            self._apply_tick(_Reader(buffer, start), maps, world)
+            self._seq = seq
+
+    def _apply_tick(self, reader: _Reader, maps: dict[str, Map], world: RestoredWorld):
+        changed_cells = []
+        (location_count,) = reader.unpack("<H")
+        for _ in range(location_count):
+            map_id = reader.string()
+            version, cell_count = reader.unpack("<QI")
+            world_map = maps[map_id]
+            world_map.version = version
+            width = world_map.get_map_size()[1]
+            for _ in range(cell_count):
+                (index,) = reader.unpack("<I")
+                objects = self._read_stack(reader, world_map)
+                changed_cells.append((world_map, *divmod(index, width), objects))
+        (player_count,) = reader.unpack("<I")
+        for _ in range(player_count):
+            self._read_player(reader, maps, world)
+        for world_map, x, y, objects in changed_cells:
+            world_map.set_objects(x, y, [self._players[obj.user_id] if isinstance(obj, _PlayerReference) else obj
+                                         for obj in objects])
+
+    def _resolve_players(self, world: Map):
+        height, width = world.get_map_size()
+        for index, stack in list(world.get_overlay_cells()):
+            if any(isinstance(obj, _PlayerReference) for obj in stack):
+                x, y = divmod(index, width)
+                world.set_objects(x, y, [self._players[obj.user_id] if isinstance(obj, _PlayerReference) else obj
+                                         for obj in world.get_objects(x, y)])
+
+
+class _PlayerReference:
+    __slots__ = ("user_id", "pos_x", "pos_y")
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.pos_x = 0
+        self.pos_y = 0
+
+    def set_position(self, x, y):
+        self.pos_x = x
+        self.pos_y = y
@@ -0,0 +1,90 @@
+import json
+from abc import ABC, abstractmethod
+
+from errors.errors import CodecNotAvailableError
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class MessageCodec(ABC):
+    name: str
+
+    @abstractmethod
+    def encode(self, value) -> bytes:
+        pass
+
+    @abstractmethod
+    def decode(self, data: bytes):
+        pass
+
+
+class JsonCodec(MessageCodec):
+    name = "json"
+
+    def encode(self, value) -> bytes:
+        return json.dumps(value).encode("utf-8")
+
+    def decode(self, data: bytes):
+        return json.loads(data)
+
+
+class OrjsonCodec(MessageCodec):
+    name = "orjson"
+
+    def __init__(self):
+        if orjson is None:
+            raise CodecNotAvailableError(self.name)
+
+    def encode(self, value) -> bytes:
+        return orjson.dumps(value)
+
+    def decode(self, data: bytes):
+        return orjson.loads(data)
+
+
+class MsgPackCodec(MessageCodec):
+    name = "msgpack"
+
+    def __init__(self):
+        if msgpack is None:
+            raise CodecNotAvailableError(self.name)
+
+    def encode(self, value) -> bytes:
+        return msgpack.packb(value, use_bin_type=True)
+
+    def decode(self, data: bytes):
+        return msgpack.unpackb(data, raw=False)
+
+
+CODECS: dict[str, type[MessageCodec]] = {
+    JsonCodec.name: JsonCodec,
+    OrjsonCodec.name: OrjsonCodec,
+    MsgPackCodec.name: MsgPackCodec,
+}
+
+
+def get_codec(name: str) -> MessageCodec:
+    # "fast_json" picks orjson when it is installed and falls back to the stdlib codec otherwise.
+    if name == "fast_json":
+        name = OrjsonCodec.name if orjson is not None else JsonCodec.name
+    codec_type = CODECS.get(name)
+    if codec_type is None:
+        raise CodecNotAvailableError(name)
+    return codec_type()
+
+
+class TopicCodecs:
+    def __init__(self, default: str = JsonCodec.name, topics: dict[str, str] | None = None):
+        self._default = get_codec(default)
+        self._topics = {topic: get_codec(name) for topic, name in (topics or {}).items()}
+
+    def for_topic(self, topic: str) -> MessageCodec:
+        return self._topics.get(topic, self._default)
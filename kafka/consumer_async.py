@@ -1,59 +1,107 @@
 import asyncio
-import json
 
-from aiokafka import AIOKafkaConsumer
-from aiokafka.errors import KafkaError
-from config.settings import settings, consumer_kafka_settings
+from config.settings import settings
+from errors.errors import TransportError
+from kafka.codec import TopicCodecs
+from kafka.event_lanes import UserEventLanes
+from metrics.game_metrics import EVENTS_RECEIVED, EVENT_BYTES_RECEIVED, end_to_end_latency
+from transport.base import InboundTransport, Record
 
 
 class AIOGameMapKafkaConsumer:
     _poll_timeout = 1
     _consumer_config = {}
 
-    def __init__(self, game_manager):
-        self.topics = [settings.topic.player_event_kafka_topic]
+    def __init__(self, game_manager, transport: InboundTransport):
         self.game_manager = game_manager
-        self.consumer: AIOKafkaConsumer | None = None
+        self.transport = transport
         self._running = False
+        self._codecs = TopicCodecs(settings.codec.default, settings.codec.topics)
+        self._lanes: UserEventLanes | None = None
+        if settings.kafka_consumer_concurrent_lanes:
+            self._lanes = UserEventLanes(self.game_manager.process_event, settings.kafka_consumer_max_lanes)
+        self._max_records = settings.kafka_consumer_min_fetch_records
+        self._timeout_ms = settings.kafka_consumer_max_fetch_timeout_ms
 
     async def start(self):
         if not self._running:
             try:
-                self.consumer = AIOKafkaConsumer(**consumer_kafka_settings.get_config())
-                self.consumer.subscribe(self.topics)
-                await self.consumer.start()
-            except KafkaError as err:
-                print(f"Consumer Kafka start error: {err}")
+                await self.transport.start()
+            except TransportError as err:
+                print(f"Consumer transport start error: {err}")
                 return
             self._running = True
 
     async def run(self, stop_event: asyncio.Event):
+        if self._lanes is not None:
+            await self.__run_lanes(stop_event)
+            return
         try:
             while not stop_event.is_set():
                 try:
-                    messages = await self.consumer.getmany(timeout_ms=250, max_records=10)
-                    if messages:
+                    records = await self.transport.receive(max_records=10, timeout_ms=250)
+                    if records:
                         try:
-                            await self.__process_messages(messages)
-                        except KafkaError as err:
-                            print(f"Consumer Kafka start error: {err}")
+                            await self.__process_records(records)
                         except Exception as err:
                             print(f"Exception: {err}")
                             raise
-                except RuntimeError as err:
-                    print(f"Consumer Kafka error: {err}")
+                except (TransportError, RuntimeError) as err:
+                    print(f"Consumer transport error: {err}")
         except asyncio.CancelledError:
             print("Consumer task cancelled.")
         finally:
             await self.close()
 
-    async def __process_messages(self, batch):
-        for topic_part, records in batch.items():
-            for record in records:
-                key = record.key.decode("utf-8")
-                value = json.loads(record.value.decode("utf-8"))
-                await self.game_manager.process_event(key, value)
+    async def __process_records(self, records: list[Record]):
+        for record in records:
+            key = self.__record_received(record)
+            value = self._codecs.for_topic(record.topic).decode(record.value)
+            await self.game_manager.process_event(key, value)
+
+    @staticmethod
+    def __record_received(record: Record) -> str:
+        key = record.key.decode("utf-8")
+        EVENTS_RECEIVED.inc()
+        EVENT_BYTES_RECEIVED.inc(len(record.value))
+        end_to_end_latency.begin(key, record.timestamp)
+        return key
+
+    async def __run_lanes(self, stop_event: asyncio.Event):
+        try:
+            while not stop_event.is_set():
+                try:
+                    self._lanes.raise_errors()
+                    # Stop fetching while the lanes are still chewing on a large backlog.
+                    if self._lanes.get_backlog() >= settings.kafka_consumer_max_fetch_records:
+                        await asyncio.sleep(settings.kafka_consumer_min_fetch_timeout_ms / 1000)
+                        continue
+                    records = await self.transport.receive(max_records=self._max_records,
+                                                           timeout_ms=self._timeout_ms)
+                    for record in records:
+                        key = self.__record_received(record)
+                        self._lanes.submit(key, self._codecs.for_topic(record.topic).decode(record.value))
+                    self.__resize_fetch(len(records))
+                except (TransportError, RuntimeError) as err:
+                    print(f"Consumer transport error: {err}")
+                except Exception as err:
+                    print(f"Exception: {err}")
+                    raise
+        except asyncio.CancelledError:
+            print("Consumer task cancelled.")
+        finally:
+            await self._lanes.close()
+            await self.close()
+
+    def __resize_fetch(self, fetched: int):
+        # A full fetch means records are piling up in the topic: fetch more at once and stop waiting for them.
+        # A sparse one lets the batch shrink back and the poll wait longer.
+        if fetched >= self._max_records:
+            self._max_records = min(self._max_records * 2, settings.kafka_consumer_max_fetch_records)
+            self._timeout_ms = settings.kafka_consumer_min_fetch_timeout_ms
+        elif fetched < self._max_records // 4:
+            self._max_records = max(self._max_records // 2, settings.kafka_consumer_min_fetch_records)
+            self._timeout_ms = settings.kafka_consumer_max_fetch_timeout_ms
 
     async def close(self):
-        if self.consumer:
-            await self.consumer.stop()
\ No newline at end of file
+        await self.transport.close()
\ No newline at end of file
@@ -0,0 +1,55 @@
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable
+
+
+# Fans events out to one lane per user: events of the same user are handled strictly in order, while different
+# users' lanes run concurrently (bounded by max_concurrency). A lane task lives only while its user has pending
+# events. A failed handler stops its lane and the error is re-raised by the consumer loop via raise_errors().
+class UserEventLanes:
+    def __init__(self, handler: Callable[[str, object], Awaitable], max_concurrency: int = 64):
+        self._handler = handler
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._lanes: dict[str, deque] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._errors: list[Exception] = []
+
+    def submit(self, user_id: str, event):
+        lane = self._lanes.get(user_id)
+        if lane is not None:
+            lane.append(event)
+            return
+        lane = self._lanes[user_id] = deque([event])
+        task = asyncio.create_task(self._drain_lane(user_id, lane))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def get_backlog(self) -> int:
+        return sum(len(lane) for lane in self._lanes.values())
+
+    def raise_errors(self):
+        if self._errors:
+            error = self._errors[0]
+            self._errors.clear()
+            raise error
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._lanes.clear()
+
+    async def _drain_lane(self, user_id: str, lane: deque):
+        try:
+            while lane:
+                event = lane.popleft()
+                async with self._semaphore:
+                    await self._handler(user_id, event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:
+            self._errors.append(err)
+        finally:
+            # No await between the last emptiness check and this pop, so a concurrent submit either landed in the
+            # lane before the loop ended or will start a new lane.
+            self._lanes.pop(user_id, None)
@@ -1,12 +1,15 @@
 import asyncio
-import json
 import threading
+import time
 
-from aiokafka import AIOKafkaProducer
-
-from game.game_app import Main
-from game.queue_wrapper import DefaultBufferQueue
-from config.settings import settings, producer_kafka_settings
+from errors.errors import TransportError
+from game.game_tick import TickSource
+from game.map_codec import EncodedChunks
+from kafka.codec import TopicCodecs
+from metrics.game_metrics import BYTES_SENT, MESSAGES_SENT, SEND_SECONDS, end_to_end_latency
+from metrics.tick_profiler import TickProfiler
+from config.settings import settings
+from transport.base import OutboundTransport, Record
 
 
 class AIOGameMapKafkaProducer:
@@ -18,6 +21,7 @@ class AIOGameMapKafkaProducer:
     _player_updates_topic: str
     _location_updates_topic: str
     _game_updates_topic: str
+    _observations_topic: str
 
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
@@ -26,46 +30,57 @@ class AIOGameMapKafkaProducer:
                     cls._instance = super().__new__(cls)
         return cls._instance
 
-    def __init__(self, output_queue: DefaultBufferQueue, game: Main, tick: int):
+    def __init__(self, tick_source: TickSource, tick: int, transport: OutboundTransport):
         if not self._initialized:
-            self.game = game
             self.tick = tick
-            self.producer = None
-            self._output_queue = output_queue
+            self.transport = transport
+            self._tick_source = tick_source
+            self._codecs = TopicCodecs(settings.codec.default, settings.codec.topics)
             self._initialized = True
             self._player_updates_topic = settings.topic.player_update_kafka_topic
             self._location_updates_topic = settings.topic.location_update_kafka_topic
             self._game_updates_topic = settings.topic.game_update_kafka_topic
+            self._observations_topic = settings.topic.observation_kafka_topic
+            self._profiler = TickProfiler(tick, settings.game.slow_tick_fraction, settings.game.slow_tick_profile_dir,
+                                          settings.game.slow_tick_sample_interval_ms,
+                                          settings.game.slow_tick_max_profiles)
 
     async def start(self):
         if not self._is_running:
             try:
-                self.producer = AIOKafkaProducer(**producer_kafka_settings.get_config())
-                await self.producer.start()
-            except Exception as err:
-                print(f"Producer Kafka error: {err}")
+                await self.transport.start()
+            except TransportError as err:
+                print(f"Producer transport error: {err}")
                 return
             self._is_running = True
 
     async def run(self, stop_event: asyncio.Event):
-        if self.producer is None:
+        if not self._is_running:
             await self.start()
         try:
             while not stop_event.is_set():
                 await asyncio.sleep(self.tick / 1000)
-                buffer = await self._output_queue.drain_buffer()
+                self._profiler.start_tick()
+                buffer = await self._tick_source.next_buffer()
 
                 try:
+                    send_started: dict[str, float] = {}
                     for topic, data in buffer.items():
+                        if data:
+                            send_started[topic] = time.perf_counter()
                         if topic == self._player_updates_topic:
                             await self._send_player_updates(data)
                         elif topic == self._location_updates_topic:
                             await self._send_location_updates(data)
                         elif topic == self._game_updates_topic:
                             await self._send_game_updates(data)
-                    self.game.unlock_all_users()
+                        elif topic == self._observations_topic:
+                            await self._send_observations(data)
+                    await self.transport.flush()
+                    self._record_delivery(buffer, send_started)
+                    await self._profiler.end_tick()
                 except Exception as err:
-                    print(f"Kafka producer error sending message: {err}")
+                    print(f"Producer error sending message: {err}")
                     raise
 
         except asyncio.CancelledError:
@@ -75,38 +90,51 @@ class AIOGameMapKafkaProducer:
             self._is_running = False
 
     async def close(self):
-        if self.producer:
-            await self.producer.stop()
+        self._profiler.close()
+        await self.transport.close()
+
+    def _record_delivery(self, buffer: dict, send_started: dict[str, float]):
+        flushed_at = time.perf_counter()
+        for topic, started_at in send_started.items():
+            SEND_SECONDS.labels(topic).observe(flushed_at - started_at)
+        # Updates answering a user's events are keyed by the user id.
+        for topic in (self._player_updates_topic, self._game_updates_topic):
+            for key in buffer.get(topic, ()):
+                end_to_end_latency.end(key)
 
     async def _send_game_updates(self, data):
         for key, value in data.items():
+            if isinstance(value, EncodedChunks):
+                for chunk in value:
+                    await self._send_message(self._game_updates_topic, key, chunk)
+                continue
             await self._send_message(self._game_updates_topic, key, value)
 
     async def _send_location_updates(self, data):
+        # The map sequence number travels as a header so the value keeps its {"x,y": tile} shape.
         for key, value in data.items():
-            await self._send_message(self._location_updates_topic, key, value)
-
-    async def _send_player_updates(self, data: dict[str, str]):
-        user_ids = self.game.player_controllers.keys()
-        for user_id in user_ids:
-            user_params: dict | None = data.get(user_id, None)
-            if user_params is None:
-                player = self.game.player_controllers.get(user_id)
-                await player.skip_turn()
-                # user_params = player.get_player().get_player_parameters()
-                if user_params is None:
-                    continue
+            headers = [("seq", str(value["seq"]).encode("utf-8"))]
+            await self._send_message(self._location_updates_topic, key, value["cells"], headers=headers)
+
+    async def _send_observations(self, data: dict[str, bytes]):
+        for location_id, batch in data.items():
+            await self._send_message(self._observations_topic, location_id, batch)
+
+    async def _send_player_updates(self, data: dict[str, dict]):
+        for user_id, user_params in data.items():
             await self._send_message(self._player_updates_topic, user_id, user_params)
 
-    async def _send_message(self, topic, key, value):
-        encoded_message = self._ecode_message(key, value)
-        metadata = await self.producer.send_and_wait(topic=topic,
-                                                     key=encoded_message.get("key"),
-                                                     value=encoded_message.get("value"))
+    async def _send_message(self, topic, key, value, headers: list[tuple[str, bytes]] | None = None):
+        # Only enqueues the record, the delivery of the whole tick is awaited once by the transport flush.
+        encoded_message = self._ecode_message(topic, key, value)
+        MESSAGES_SENT.labels(topic).inc()
+        BYTES_SENT.labels(topic).inc(len(encoded_message["key"]) + len(encoded_message["value"]))
+        await self.transport.send(Record(topic, encoded_message.get("key"), encoded_message.get("value"), headers))
 
-    def _ecode_message(self, key: str, value: dict) -> dict:
+    def _ecode_message(self, topic: str, key: str, value: dict | bytes) -> dict:
+        # Values may arrive already encoded, e.g. cached full map snapshots.
         new_message = {
             "key": key.encode("utf-8"),
-            "value": json.dumps(value).encode("utf-8"),
+            "value": value if isinstance(value, bytes) else self._codecs.for_topic(topic).encode(value),
         }
         return new_message
@@ -0,0 +1,72 @@
+import asyncio
+
+from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
+from aiokafka.errors import KafkaError
+
+from errors.errors import TransportError
+from config.settings import producer_kafka_settings, consumer_kafka_settings
+from transport.base import InboundTransport, OutboundTransport, Record
+
+
+class KafkaInboundTransport(InboundTransport):
+    def __init__(self, topics: list[str]):
+        self._topics = topics
+        self.consumer: AIOKafkaConsumer | None = None
+
+    async def start(self):
+        if self.consumer is not None:
+            return
+        try:
+            self.consumer = AIOKafkaConsumer(**consumer_kafka_settings.get_config())
+            self.consumer.subscribe(self._topics)
+            await self.consumer.start()
+        except KafkaError as err:
+            self.consumer = None
+            raise TransportError(err)
+
+    async def receive(self, max_records: int, timeout_ms: int) -> list[Record]:
+        try:
+            batch = await self.consumer.getmany(timeout_ms=timeout_ms, max_records=max_records)
+        except KafkaError as err:
+            raise TransportError(err)
+        return [Record(record.topic, record.key, record.value, list(record.headers) or None, record.timestamp)
+                for records in batch.values() for record in records]
+
+    async def close(self):
+        if self.consumer:
+            await self.consumer.stop()
+
+
+class KafkaOutboundTransport(OutboundTransport):
+    def __init__(self):
+        self.producer: AIOKafkaProducer | None = None
+        self._pending_sends: list[asyncio.Future] = []
+
+    async def start(self):
+        if self.producer is not None:
+            return
+        try:
+            self.producer = AIOKafkaProducer(**producer_kafka_settings.get_config())
+            await self.producer.start()
+        except KafkaError as err:
+            self.producer = None
+            raise TransportError(err)
+
+    async def send(self, record: Record):
+        # Only enqueues the record: aiokafka collects it into the batch of its topic partition and the delivery
+        # of the whole tick is awaited once in flush.
+        delivery = await self.producer.send(topic=record.topic, key=record.key, value=record.value,
+                                            headers=record.headers)
+        self._pending_sends.append(delivery)
+
+    async def flush(self):
+        pending_sends, self._pending_sends = self._pending_sends, []
+        if pending_sends:
+            try:
+                await asyncio.gather(*pending_sends)
+            except KafkaError as err:
+                raise TransportError(err)
+
+    async def close(self):
+        if self.producer:
+            await self.producer.stop()
@@ -0,0 +1,54 @@
+import time
+
+from metrics.registry import REGISTRY
+
+EVENTS_RECEIVED = REGISTRY.counter("game_events_received_total", "Player events received from the transport.")
+EVENT_BYTES_RECEIVED = REGISTRY.counter("game_event_bytes_received_total",
+                                        "Encoded bytes of the player events received.")
+EVENT_HANDLING_SECONDS = REGISTRY.histogram("game_event_handling_seconds",
+                                            "Time process_event spends on an event, by action.", ["action"])
+QUEUE_WAIT_SECONDS = REGISTRY.histogram("game_output_queue_wait_seconds",
+                                        "Time a message waits in the output buffer until it is drained, by topic.",
+                                        ["topic"])
+SEND_SECONDS = REGISTRY.histogram("game_producer_send_seconds",
+                                  "Time from the first send of a topic in a tick until the transport flushed it.",
+                                  ["topic"])
+MESSAGES_SENT = REGISTRY.counter("game_producer_messages_total", "Messages sent, by topic.", ["topic"])
+BYTES_SENT = REGISTRY.counter("game_producer_bytes_total", "Encoded key and value bytes sent, by topic.", ["topic"])
+END_TO_END_SECONDS = REGISTRY.histogram("game_end_to_end_seconds",
+                                        "Time from the timestamp of a player event to the publish of the first "
+                                        "update sent to that user afterwards.")
+TICK_SECONDS = REGISTRY.histogram("game_tick_seconds",
+                                  "Work time of a producer tick: building its messages, sending and flushing them.")
+TICK_OVERRUNS = REGISTRY.counter("game_tick_overruns_total", "Ticks whose work took longer than the tick.")
+SLOW_TICKS = REGISTRY.counter("game_slow_ticks_total", "Ticks over the slow tick fraction of the tick.")
+# Actions take microseconds, far below the latency buckets.
+ACTION_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1)
+ACTION_SECONDS = REGISTRY.histogram("game_player_action_seconds",
+                                    "Time Player.do_action spends on an action, by action; includes the actions it "
+                                    "runs itself, like the one of a used item.", ["action"], ACTION_BUCKETS)
+
+
+# Pairs a user's event with the next update published for them. Only the oldest unanswered event of a user is
+# kept, so a burst of events is measured from its first one. Works on wall-clock milliseconds, the unit of the
+# record timestamps.
+class EndToEndLatency:
+    def __init__(self, max_pending: int = 100_000):
+        self._max_pending = max_pending
+        self._pending: dict[str, int] = {}
+
+    def begin(self, user_id: str, timestamp_ms: int | None):
+        if timestamp_ms is None or user_id in self._pending:
+            return
+        if len(self._pending) >= self._max_pending:
+            # Users who never get an answer, e.g. ones that disconnected, must not grow this forever.
+            self._pending.pop(next(iter(self._pending)))
+        self._pending[user_id] = timestamp_ms
+
+    def end(self, user_id: str):
+        timestamp_ms = self._pending.pop(user_id, None)
+        if timestamp_ms is not None:
+            END_TO_END_SECONDS.observe(max(0.0, time.time() - timestamp_ms / 1000))
+
+
+end_to_end_latency = EndToEndLatency()
@@ -0,0 +1,45 @@
+import asyncio
+import logging
+
+from metrics.registry import MetricsRegistry, REGISTRY
+
+
+# Minimal HTTP endpoint for Prometheus scrapes: GET /metrics answers the registry in the text format, anything else
+# gets a 404. One request per connection.
+class MetricsServer:
+    logger = logging.getLogger("metrics.server")
+
+    def __init__(self, host: str, port: int, registry: MetricsRegistry = REGISTRY):
+        self._host = host
+        self._port = port
+        self._registry = registry
+        self._server: asyncio.AbstractServer | None = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self._host, self._port)
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            # The headers are not needed, only read off the socket.
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", self._registry.render().encode("utf-8")
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            else:
+                status, body, content_type = "404 Not Found", b"Not Found\n", "text/plain"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+                         f"Connection: close\r\n\r\n".encode("latin-1") + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError) as err:
+            self.logger.debug(f"Metrics request failed: {err}")
+        finally:
+            writer.close()
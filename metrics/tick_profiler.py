@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+from metrics.game_metrics import TICK_OVERRUNS, TICK_SECONDS, SLOW_TICKS
+
+
+# Samples the stack of one thread every interval seconds while it is active, as "outer;...;inner" strings counted
+# like in the folded format of flame graph tools. Runs on its own daemon thread, which sleeps while inactive.
+class StackSampler:
+    def __init__(self, thread_id: int, interval: float):
+        self._thread_id = thread_id
+        self._interval = interval
+        self._samples: Counter[str] = Counter()
+        self._lock = threading.Lock()
+        self._active = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="tick-stack-sampler", daemon=True)
+        self._thread.start()
+
+    def start(self):
+        with self._lock:
+            self._samples = Counter()
+        self._active.set()
+
+    def stop(self) -> Counter[str]:
+        self._active.clear()
+        with self._lock:
+            samples, self._samples = self._samples, Counter()
+        return samples
+
+    def close(self):
+        self._closed = True
+        self._active.set()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            self._active.wait()
+            if self._closed:
+                return
+            time.sleep(self._interval)
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None or not self._active.is_set():
+                continue
+            stack = self._format_stack(frame)
+            with self._lock:
+                self._samples[stack] += 1
+
+    @staticmethod
+    def _format_stack(frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+
+# Times the work of every producer tick against its budget: every tick goes to the tick histogram, the ones over
+# the budget are counted as overruns. With profile_dir set, the stack of the event loop is sampled during each tick
+# and a tick taking more than slow_fraction of the budget has its samples written to profile_dir as a folded stack
+# file (flamegraph.pl, speedscope), keeping the last max_profiles files.
+class TickProfiler:
+    logger = logging.getLogger("metrics.tick_profiler")
+
+    def __init__(self, tick_ms: int, slow_fraction: float = 0.8, profile_dir: str | None = None,
+                 sample_interval_ms: int = 5, max_profiles: int = 100):
+        self._budget = tick_ms / 1000
+        self._slow_threshold = self._budget * slow_fraction
+        self._profile_dir = profile_dir
+        self._sample_interval = sample_interval_ms / 1000
+        self._profiles: deque[str] = deque()
+        self._max_profiles = max_profiles
+        self._sampler: StackSampler | None = None
+        self._started_at: float | None = None
+
+    def start_tick(self):
+        if self._profile_dir is not None:
+            if self._sampler is None:
+                os.makedirs(self._profile_dir, exist_ok=True)
+                self._sampler = StackSampler(threading.get_ident(), self._sample_interval)
+            self._sampler.start()
+        self._started_at = time.perf_counter()
+
+    async def end_tick(self) -> float:
+        duration = time.perf_counter() - self._started_at
+        samples = self._sampler.stop() if self._sampler is not None else None
+        TICK_SECONDS.observe(duration)
+        if duration > self._budget:
+            TICK_OVERRUNS.inc()
+        if duration > self._slow_threshold:
+            SLOW_TICKS.inc()
+            if samples:
+                path = await asyncio.to_thread(self._write_profile, duration, samples)
+                self.logger.warning(f"Tick took {duration * 1000:.1f} ms of its {self._budget * 1000:.0f} ms "
+                                    f"budget, profile written to {path}")
+        return duration
+
+    def close(self):
+        if self._sampler is not None:
+            self._sampler.close()
+            self._sampler = None
+
+    def _write_profile(self, duration: float, samples: Counter[str]) -> str:
+        path = os.path.join(self._profile_dir, f"slow_tick_{int(time.time() * 1000)}_{int(duration * 1000)}ms.folded")
+        with open(path, "w", encoding="utf-8") as file:
+            for stack, count in samples.most_common():
+                file.write(f"{stack} {count}\n")
+        self._profiles.append(path)
+        while len(self._profiles) > self._max_profiles:
+            old_path = self._profiles.popleft()
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+        return path
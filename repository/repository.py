@@ -1,8 +1,8 @@
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import selectinload
 from db.db import db_helper
-from models.models import Character
+from models.models import Character, CharStats
 from game.player import Player
 from utils.mapper import player_to_player_model, player_stats_to_stats_model
 
@@ -59,40 +59,22 @@ class CharacterRepository:
             )
             return result.scalars().all()
 
-    async def update_stats(self, player: Player) -> Character | None:
+    async def update_stats_many(self, rows: list[dict]):
+        # One bulk UPDATE by primary key: every row holds the CharStats id and the columns to set.
         async for session in db_helper.session_getter():
             try:
-                result = await session.execute(
-                    select(Character)
-                    .where(Character.name == player.name)
-                    .options(selectinload(Character.stats))
-                )
-                character: Character = result.scalar_one_or_none()
-                if not character:
-                    return None
-
-                self._update_stats(character, player)
-
+                await session.execute(update(CharStats), rows)
                 await session.commit()
-                await session.refresh(character)
-                return character
-            except SQLAlchemyError as e:
-                session.rollback()
+            except SQLAlchemyError:
+                await session.rollback()
+                raise
 
-    def _update_stats(self, character: Character, player: Player) -> Character:
-        stats = character.stats
-        stats.health = player.health
-        stats.energy = player.energy
-        stats.hungry = player.hungry
-        stats.position_x = player.pos_x
-        stats.position_y = player.pos_y
-        stats.inventory = player.inventory
-        stats.location_id = player.world.map_id
-        stats.attack_modifier = player.attack_modifier
-        stats.attack_damage = player.attack_damage
-        stats.defence = player.defence
-        stats.is_dead = player.is_dead
-        return character
+    async def get_stats_ids(self, char_ids: list[int]) -> dict[int, int]:
+        async for session in db_helper.session_getter():
+            result = await session.execute(
+                select(Character.id, Character.stats_id).where(Character.id.in_(char_ids))
+            )
+            return {char_id: stats_id for char_id, stats_id in result if stats_id is not None}
 
     async def delete(self, username: str, char_name: str) -> bool:
         async for session in db_helper.session_getter():
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+from itertools import islice
+from typing import Iterable
+
+from game.player import Player
+from repository.repository import CharacterRepository
+from utils.mapper import player_stats_to_stats_row
+
+
+# Write-behind saving of character stats. The game only marks changed players dirty; a background task saves the
+# latest state of at most batch_size of them every interval_ms in one bulk UPDATE, so saving never waits on the
+# database in the event path and writes are bounded to batch_size rows per interval. A failed batch goes back to
+# the dirty players and is retried after a delay doubling up to max_retry_delay_ms. close flushes what is left.
+class StatsWriteBehind:
+    logger = logging.getLogger("repository.stats_writer")
+
+    def __init__(self, char_repository: CharacterRepository, interval_ms: int = 1000, batch_size: int = 500,
+                 max_retry_delay_ms: int = 30000, close_attempts: int = 3):
+        self._char_repository = char_repository
+        self._interval = interval_ms / 1000
+        self._batch_size = batch_size
+        self._max_retry_delay = max_retry_delay_ms / 1000
+        self._close_attempts = close_attempts
+        # Players to save by character id, in the order they were first changed since their last save.
+        self._dirty: dict[int, Player] = {}
+        self._in_flight: dict[int, Player] = {}
+        self._task: asyncio.Task | None = None
+
+    def mark_dirty(self, players: Iterable[Player]):
+        for player in players:
+            # Characters that were never saved have no row to update.
+            if player.char_id >= 0:
+                self._dirty[player.char_id] = player
+
+    def get_pending_row(self, char_id: int) -> dict | None:
+        # The unsaved stats of a character, newer than what the database returns for it.
+        player = self._dirty.get(char_id) or self._in_flight.get(char_id)
+        return player_stats_to_stats_row(player) if player is not None else None
+
+    def get_pending_count(self) -> int:
+        return len(self._dirty) + len(self._in_flight)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        attempts = 0
+        while self._dirty and attempts < self._close_attempts:
+            try:
+                await self.flush_batch()
+            except Exception as err:
+                attempts += 1
+                self.logger.error(f"Final stats flush failed, attempt {attempts}", exc_info=err)
+        if self._dirty:
+            self.logger.error(f"Stats of {len(self._dirty)} characters were not saved")
+
+    async def flush_batch(self) -> int:
+        if not self._dirty:
+            return 0
+        char_ids = list(islice(self._dirty, self._batch_size))
+        batch = {char_id: self._dirty.pop(char_id) for char_id in char_ids}
+        self._in_flight = batch
+        try:
+            await self.__resolve_stats_ids(batch)
+            rows = [player_stats_to_stats_row(player) for player in batch.values() if player.stats_id >= 0]
+            if rows:
+                await self._char_repository.update_stats_many(rows)
+        except BaseException:
+            # Characters marked again meanwhile are already back with their newest player.
+            for char_id, player in batch.items():
+                self._dirty.setdefault(char_id, player)
+            raise
+        finally:
+            self._in_flight = {}
+        return len(rows)
+
+    async def _run(self):
+        delay = self._interval
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self.flush_batch()
+                delay = self._interval
+            except Exception as err:
+                delay = min(delay * 2, self._max_retry_delay)
+                self.logger.error(f"Saving the stats of {len(self._dirty)} characters failed, retrying in "
+                                  f"{delay:.1f} s", exc_info=err)
+
+    async def __resolve_stats_ids(self, batch: dict[int, Player]):
+        # Players restored from the world store only know their character id.
+        unresolved = [char_id for char_id, player in batch.items() if player.stats_id < 0]
+        if not unresolved:
+            return
+        stats_ids = await self._char_repository.get_stats_ids(unresolved)
+        for char_id in unresolved:
+            stats_id = stats_ids.get(char_id)
+            if stats_id is None:
+                self.logger.warning(f"Character {char_id} has no stats row, its stats are not saved")
+                continue
+            batch[char_id].stats_id = stats_id
@@ -1,5 +1,6 @@
 import inspect
 import logging
+import time
 from typing import Any
 from abc import ABC, abstractmethod
 
@@ -8,14 +9,22 @@ from sqlalchemy.exc import SQLAlchemyError
 
 from dto.base_action_dto import BaseActionDto
 from errors.action_errors import IncorrectActionValues
+from dto.game_action_dto import FULL_MAP_FORMATS
+from game.chunked_map import ChunkedMap
 from game.game_app import Main
+from game.map_codec import BINARY_KEY_SUFFIX
 from game.player import Player
 from game.player_controller import PlayerController
 from game.queue_wrapper import DefaultBufferQueue
+from game.snapshot_cache import MapSnapshotCache
+from game.world_store import WorldStore
 from config.settings import settings
 from repository.repository import CharacterRepository
-from utils.mapper import character_model_to_player
+from repository.stats_writer import StatsWriteBehind
+from utils.mapper import apply_stats_row, character_model_to_player
 from game.actions import actionDTOMapConfig, GAME_ACTIONS, PLAYER_ACTIONS
+from kafka.codec import TopicCodecs
+from metrics.game_metrics import EVENT_HANDLING_SECONDS
 
 
 class GameManager(ABC):
@@ -28,14 +37,6 @@ class GameManager(ABC):
     async def process_event(self, user_id, data: Any):
         pass
 
-    @abstractmethod
-    def register_observer(self, observer):
-        pass
-
-    @abstractmethod
-    def unregister_observer(self, observer):
-        pass
-
 
 class KafkaGameManager(GameManager):
     _GAME_UPDATE_TOPIC = settings.topic.game_update_kafka_topic
@@ -47,13 +48,20 @@ class KafkaGameManager(GameManager):
                  game: Main,
                  kafka_producer,
                  output_queue: DefaultBufferQueue,
-                 char_repository: CharacterRepository
+                 char_repository: CharacterRepository,
+                 stats_writer: StatsWriteBehind
                  ):
         self._game: Main = game
         self._kafka_producer = kafka_producer
         self._output_queue = output_queue
         self._users = set()
         self._char_repository = char_repository
+        self._stats_writer = stats_writer
+        self._game.set_stats_writer(stats_writer)
+        codecs = TopicCodecs(settings.codec.default, settings.codec.topics)
+        self._snapshot_cache = MapSnapshotCache(codecs.for_topic(self._GAME_UPDATE_TOPIC).encode)
+        self.register_observer(self._snapshot_cache)
+        self._game.scheduler.set_handler(self.__apply_event_to_player)
 
     def register_observer(self, observer):
         self._game.add_map_observer(observer)
@@ -62,12 +70,19 @@ class KafkaGameManager(GameManager):
         self._game.remove_map_observer(observer)
 
     async def process_event(self, user_id, data: Any):
+        started_at = time.perf_counter()
+        action = data.get("action", "") if isinstance(data, dict) else ""
+        try:
+            await self.__process_event(user_id, data)
+        finally:
+            # Unknown actions share one label, so clients cannot grow the label set.
+            label = action if action in actionDTOMapConfig else "unknown"
+            EVENT_HANDLING_SECONDS.labels(label).observe(time.perf_counter() - started_at)
+
+    async def __process_event(self, user_id, data: Any):
         print("IN event")
         if not self._game.check_is_user_present(user_id):
             self._game.add_user(user_id)
-        if self._game.users[user_id]:
-            return
-        self._game.lock_user(user_id)
         action = data.get("action", "")
         params = data.get("params", [])
         if params is None:
@@ -82,7 +97,8 @@ class KafkaGameManager(GameManager):
             raise IncorrectActionValues()
         match action:
             case action if action in self._player_actions:
-                await self.__apply_event_to_player(user_id=user_id, action_dto=action_dto)
+                # Applied by the scheduler on the next tick.
+                self._game.scheduler.submit(user_id, action_dto)
             case action if action in self._game_actions:
                 await self.__apply_event_to_game(user_id=user_id, action_dto=action_dto)
             case _:
@@ -92,24 +108,51 @@ class KafkaGameManager(GameManager):
         await self._game.generate_main_location()
         await self.__get_full_map()
 
+    async def start_world(self, world_store: WorldStore | None = None):
+        if world_store is not None and self._game.restore_world(world_store):
+            await self.__get_full_map()
+        else:
+            await self.generate_main_location()
+        if world_store is not None:
+            self._game.set_world_store(world_store)
+
     async def __process_player_death(self, player: Player):
         self._game.remove_user(player.user_id)
         self._game.player_controllers.pop(player.user_id, None)
         await player.notify_observers()
-        await self.__update_payer_data(player)
+        self._stats_writer.mark_dirty((player,))
 
-    async def __get_full_map(self, location_id=None):
+    async def __get_full_map(self, location_id=None, map_format: str = "json"):
         location = self._game.get_location(location_id)
-        full_map = location.get_map()
-        location_id = full_map.map_id
-        full_map_data = {f"{i},{j}": full_map.location_map[i][j][0].name
-                         for i in range(len(full_map.location_map)) for j in range(len(full_map.location_map[i]))}
+        if map_format == "json":
+            key = location.get_map().map_id
+            value = self._snapshot_cache.get_full_map_payload(location)
+        else:
+            key = location.get_map().map_id + BINARY_KEY_SUFFIX
+            value = self._snapshot_cache.get_full_map_chunks(location,
+                                                              chunk_size=settings.game.full_map_chunk_bytes,
+                                                              rle=map_format == "binary_rle")
         await self._output_queue.put({
             "topic": self._GAME_UPDATE_TOPIC,
-            "key": location_id,
-            "value": {"location_id": location_id,
-                      "location_size": location.get_location_size(),
-                      "location_data": full_map_data}
+            "key": key,
+            "value": value
+        })
+
+    async def __resume_map(self, user_id: str, location_id: str, seq: int):
+        location = self._game.get_location(location_id)
+        world = location.get_map()
+        # get_location falls back to the main location for unknown ids, whose history must not answer for them.
+        changes = world.get_changes_since(seq) if world.map_id == location_id else None
+        if changes is None:
+            await self.__get_full_map(world.map_id)
+            return
+        await self._output_queue.put({
+            "topic": self._GAME_UPDATE_TOPIC,
+            "key": user_id,
+            "value": {"location_id": world.map_id,
+                      "from_seq": seq,
+                      "seq": world.version,
+                      "location_data": changes}
         })
 
     async def __get_player(self, user_id, char_name: str) -> Player | None:
@@ -123,6 +166,10 @@ class KafkaGameManager(GameManager):
         except SQLAlchemyError as err:
             self.logger.error(f"Character {char_name} not found", exc_info=err)
             return None
+        # Stats still waiting for the writer are newer than the saved ones.
+        pending_row = self._stats_writer.get_pending_row(char.id)
+        if pending_row is not None:
+            apply_stats_row(char.stats, pending_row)
         player = character_model_to_player(char)
         return await self._game.return_character_to_game(player, char.stats.location_id)
 
@@ -137,7 +184,8 @@ class KafkaGameManager(GameManager):
             return None
         if not player:
             return
-        player.id = character.id
+        player.char_id = character.id
+        player.stats_id = character.stats_id
         await self._game.add_player_to_location(player, player.pos_x, player.pos_y, player.world.map_id)
         await self._game.create_player_controller(player)
         return player
@@ -164,13 +212,6 @@ class KafkaGameManager(GameManager):
             else:
                 result = method()
 
-    async def __update_payer_data(self, player: Player):
-        try:
-            await self._char_repository.update_stats(player)
-        except SQLAlchemyError as err:
-            self.logger.error(f"Character {player.char_id} not found", exc_info=err)
-            return None
-
     async def __apply_event_to_game(self, action_dto: BaseActionDto, user_id: str):
 
         match action_dto.action:
@@ -181,12 +222,9 @@ class KafkaGameManager(GameManager):
                     return None
                 player = player_controller.get_player()
                 if player:
-                    try:
-                        self._game.remove_user(user_id)
-                        await self._char_repository.update_stats(player)
-                        return
-                    except SQLAlchemyError as err:
-                        self.logger.error(f"Character {player.char_id} not found", exc_info=err)
+                    self._game.remove_user(user_id)
+                    self._stats_writer.mark_dirty((player,))
+                    return
                 await self.__send_char_not_found_message(user_id)
 
             case "create_player":
@@ -198,7 +236,18 @@ class KafkaGameManager(GameManager):
                     await self.__send_char_not_found_message(user_id)
 
             case "get_full_map":
-                await self.__get_full_map(action_dto.params_value)
+                params = action_dto.params_value or []
+                location_id = params[0] if params else None
+                map_format = params[1] if len(params) > 1 else "json"
+                if map_format not in FULL_MAP_FORMATS:
+                    raise IncorrectActionValues(f"Unknown full map format: {map_format}")
+                if map_format != "json" and isinstance(self._game.get_location(location_id).get_map(), ChunkedMap):
+                    raise IncorrectActionValues("Chunked locations are only sent as json")
+                await self.__get_full_map(location_id, map_format)
+
+            case "resume_map":
+                location_id, seq = action_dto.params_value
+                await self.__resume_map(user_id, location_id, seq)
 
             case "get_player":
                 player = await self.__get_player(user_id, action_dto.params_value)
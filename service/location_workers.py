@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import zlib
+from typing import Any
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from game.game_tick import TickSource, GameTick
+from game.queue_wrapper import BufferQueueWithLock
+from repository.repository import CharacterRepository
+from service.game_service import GameManager
+
+_MAP_ACTIONS = ("get_full_map", "resume_map")
+
+
+# Simulation of the locations owned by one worker in its own process: a private Main with its own manager,
+# character repository and tick loop. Every worker generates (or restores) a main location of its own, so each
+# location id belongs to exactly one worker. Events arrive on the inbox as (user_id, data) and every tick's
+# ready-to-send buffer is put on the outbox as ("updates", worker_id, buffer). The worker announces the ids of its
+# locations on start.
+def run_location_worker(worker_id: int, inbox: multiprocessing.Queue, outbox: multiprocessing.Queue, tick: int):
+    asyncio.run(_location_worker_main(worker_id, inbox, outbox, tick))
+
+
+async def _location_worker_main(worker_id: int, inbox, outbox, tick: int):
+    from game.game_app import Main
+    from game.game_observer import KafkaMapObserver, KafkaPlayerObserver
+    from config.settings import settings
+    from game.world_store import WorldStore
+    from kafka.event_lanes import UserEventLanes
+    from repository.repository import CharacterRepository
+    from repository.stats_writer import StatsWriteBehind
+    from service.game_service import KafkaGameManager
+    from db.db import db_helper
+
+    logger = logging.getLogger(f"game.worker.{worker_id}")
+    loop = asyncio.get_running_loop()
+    game = Main()
+    output_queue = BufferQueueWithLock()
+    char_repository = CharacterRepository()
+    stats_writer = StatsWriteBehind(char_repository, settings.db.stats_flush_interval_ms,
+                                    settings.db.stats_batch_size, settings.db.stats_max_retry_delay_ms)
+    game_manager = KafkaGameManager(game, None, output_queue, char_repository, stats_writer)
+    game.add_map_observer(KafkaMapObserver(output_queue))
+    game.add_player_observer(KafkaPlayerObserver(output_queue))
+    world_store = None
+    if settings.game.world_store_dir and not settings.game.chunked_world:
+        world_store = WorldStore(os.path.join(settings.game.world_store_dir, f"worker-{worker_id}"),
+                                 settings.game.snapshot_interval, settings.game.world_log_fsync)
+    await game_manager.start_world(world_store)
+    outbox.put(("locations", worker_id, game.get_locations()))
+
+    lanes = None
+    if settings.kafka_consumer_concurrent_lanes:
+        lanes = UserEventLanes(game_manager.process_event, settings.kafka_consumer_max_lanes)
+    stop_event = asyncio.Event()
+
+    async def read_events():
+        while True:
+            event = await loop.run_in_executor(None, inbox.get)
+            if event is None:
+                stop_event.set()
+                return
+            user_id, data = event
+            if lanes is not None:
+                lanes.submit(user_id, data)
+                continue
+            try:
+                await game_manager.process_event(user_id, data)
+            except Exception as err:
+                logger.error(f"Event of user {user_id} failed", exc_info=err)
+
+    stats_writer.start()
+    reader_task = asyncio.create_task(read_events())
+    game_tick = GameTick(game, output_queue)
+    try:
+        while not stop_event.is_set():
+            await asyncio.sleep(tick / 1000)
+            if lanes is not None:
+                try:
+                    lanes.raise_errors()
+                except Exception as err:
+                    logger.error("Event lane failed", exc_info=err)
+            buffer = await game_tick.next_buffer()
+            if any(buffer.values()):
+                outbox.put(("updates", worker_id, buffer))
+    finally:
+        reader_task.cancel()
+        if lanes is not None:
+            await lanes.close()
+        if world_store is not None:
+            world_store.close()
+        await stats_writer.close()
+        await db_helper.dispose()
+
+
+# Parent side of the worker processes. Map requests naming a known location go to the worker owning it. A user
+# sticks to the worker their character was loaded or created on: get_player goes to the owner of the character's
+# stored location, new characters and stored locations no worker owns are spread over the workers by a stable hash
+# of the user id. Buffers streamed back by the workers are merged until the producer asks for the next tick.
+class LocationWorkerPool(TickSource):
+    logger = logging.getLogger("game.worker_pool")
+
+    def __init__(self, workers: int, tick: int, char_repository: CharacterRepository):
+        self._workers_count = workers
+        self._tick = tick
+        self._char_repository = char_repository
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: list[multiprocessing.Process] = []
+        self._inboxes: list[multiprocessing.Queue] = []
+        self._outbox: multiprocessing.Queue | None = None
+        self._buffer = BufferQueueWithLock()
+        self._location_workers: dict[str, int] = {}
+        self._user_workers: dict[str, int] = {}
+        self._reader_task: asyncio.Task | None = None
+
+    async def start(self):
+        self._outbox = self._context.Queue()
+        for worker_id in range(self._workers_count):
+            inbox = self._context.Queue()
+            process = self._context.Process(target=run_location_worker,
+                                            args=(worker_id, inbox, self._outbox, self._tick),
+                                            name=f"location-worker-{worker_id}",
+                                            daemon=True)
+            process.start()
+            self._inboxes.append(inbox)
+            self._processes.append(process)
+        self._reader_task = asyncio.create_task(self._read_outbox())
+
+    async def submit(self, user_id: str, data: Any):
+        self._inboxes[await self._route(user_id, data)].put((user_id, data))
+
+    async def next_buffer(self) -> dict:
+        return await self._buffer.drain_buffer()
+
+    async def close(self):
+        for inbox in self._inboxes:
+            inbox.put(None)
+        if self._reader_task is not None:
+            # Wakes up the reader thread blocked on the outbox.
+            self._outbox.put(("closed", -1, None))
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+        loop = asyncio.get_running_loop()
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join, 5)
+            if process.is_alive():
+                process.terminate()
+
+    async def _route(self, user_id: str, data: Any) -> int:
+        action = data.get("action") if isinstance(data, dict) else None
+        if action in _MAP_ACTIONS and data.get("params"):
+            worker_id = self._location_workers.get(data["params"][0])
+            if worker_id is not None:
+                return worker_id
+        worker_id = self._user_workers.get(user_id)
+        if worker_id is None:
+            if action == "get_player":
+                worker_id = await self._get_character_worker(user_id, data.get("params"))
+            if worker_id is None:
+                worker_id = zlib.crc32(user_id.encode("utf-8")) % self._workers_count
+            self._user_workers[user_id] = worker_id
+        return worker_id
+
+    async def _get_character_worker(self, user_id: str, char_name) -> int | None:
+        if not isinstance(char_name, str):
+            return None
+        try:
+            character = await self._char_repository.get_by_user_id_and_character_name(user_id, char_name)
+        except SQLAlchemyError as err:
+            self.logger.error(f"Looking up the location of character {char_name} failed", exc_info=err)
+            return None
+        if character is None or character.stats is None:
+            return None
+        return self._location_workers.get(character.stats.location_id)
+
+    async def _read_outbox(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            kind, worker_id, payload = await loop.run_in_executor(None, self._outbox.get)
+            if kind == "closed":
+                return
+            if kind == "locations":
+                for location_id in payload:
+                    owner = self._location_workers.setdefault(location_id, worker_id)
+                    if owner != worker_id:
+                        self.logger.error(f"Location {location_id} of worker {worker_id} is already owned by "
+                                          f"worker {owner}, its events stay with worker {owner}")
+                continue
+            messages = [{"topic": topic, "key": key, "value": value}
+                        for topic, data in payload.items() for key, value in data.items()]
+            await self._buffer.put_many(messages)
+
+
+class WorkerGameManager(GameManager):
+    def __init__(self, pool: LocationWorkerPool):
+        self._pool = pool
+
+    async def process_event(self, user_id, data: Any):
+        await self._pool.submit(user_id, data)
@@ -0,0 +1,49 @@
+from abc import ABC, abstractmethod
+from typing import NamedTuple
+
+Headers = list[tuple[str, bytes]]
+
+
+class Record(NamedTuple):
+    topic: str
+    key: bytes
+    value: bytes
+    headers: Headers | None = None
+    # Wall-clock milliseconds when the record entered the transport, set on inbound records.
+    timestamp: int | None = None
+
+
+# Inbound side of a transport: player events as encoded records, decoded by the consumer with the topic codec.
+class InboundTransport(ABC):
+    @abstractmethod
+    async def start(self):
+        pass
+
+    # Waits at most timeout_ms for the first record and returns up to max_records, possibly none.
+    @abstractmethod
+    async def receive(self, max_records: int, timeout_ms: int) -> list[Record]:
+        pass
+
+    @abstractmethod
+    async def close(self):
+        pass
+
+
+# Outbound side of a transport: send only enqueues a record, flush waits until everything enqueued so far has been
+# delivered, which the producer does once per tick.
+class OutboundTransport(ABC):
+    @abstractmethod
+    async def start(self):
+        pass
+
+    @abstractmethod
+    async def send(self, record: Record):
+        pass
+
+    @abstractmethod
+    async def flush(self):
+        pass
+
+    @abstractmethod
+    async def close(self):
+        pass
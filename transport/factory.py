@@ -0,0 +1,18 @@
+from config.settings import settings
+from transport.base import InboundTransport, OutboundTransport
+from transport.memory import MemoryTransport
+from transport.unix_socket import UnixSocketTransport, default_socket_path
+
+
+def create_transports() -> tuple[InboundTransport, OutboundTransport]:
+    # Inbound and outbound side of the configured backend; the local backends serve both with one object.
+    backend = settings.transport.backend
+    if backend == "kafka":
+        from kafka.transport import KafkaInboundTransport, KafkaOutboundTransport
+        return KafkaInboundTransport([settings.topic.player_event_kafka_topic]), KafkaOutboundTransport()
+    if backend == "memory":
+        transport = MemoryTransport()
+    else:
+        transport = UnixSocketTransport(settings.transport.socket_path or default_socket_path(),
+                                        settings.transport.max_client_buffer)
+    return transport, transport
@@ -0,0 +1,49 @@
+import asyncio
+import time
+
+from transport.base import InboundTransport, OutboundTransport, Record
+
+
+# Both sides of a transport on asyncio queues, for bots and tests running in the server's event loop. The game side
+# uses the transport interfaces; the other side puts events with submit and reads updates with get_update.
+class MemoryTransport(InboundTransport, OutboundTransport):
+    def __init__(self, max_updates: int = 0):
+        self._events: asyncio.Queue[Record] = asyncio.Queue()
+        self._updates: asyncio.Queue[Record] = asyncio.Queue(max_updates)
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def submit(self, record: Record):
+        if record.timestamp is None:
+            record = record._replace(timestamp=int(time.time() * 1000))
+        self._events.put_nowait(record)
+
+    async def get_update(self) -> Record:
+        return await self._updates.get()
+
+    def get_pending_updates(self) -> list[Record]:
+        updates = []
+        while not self._updates.empty():
+            updates.append(self._updates.get_nowait())
+        return updates
+
+    async def receive(self, max_records: int, timeout_ms: int) -> list[Record]:
+        try:
+            records = [await asyncio.wait_for(self._events.get(), timeout_ms / 1000)]
+        except asyncio.TimeoutError:
+            return []
+        while len(records) < max_records and not self._events.empty():
+            records.append(self._events.get_nowait())
+        return records
+
+    async def send(self, record: Record):
+        # Waits for room when max_updates bounds the queue, so a reader that falls behind slows the game down
+        # instead of growing the queue without limit.
+        await self._updates.put(record)
+
+    async def flush(self):
+        pass
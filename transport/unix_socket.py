@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import os
+import socket
+import stat
+import struct
+import tempfile
+import time
+
+from errors.errors import TransportError
+from transport.base import InboundTransport, OutboundTransport, Record
+
+# Frame layout (little-endian), the same in both directions:
+#   header   <IHHB  value length, topic length, key length, header count
+#   topic    utf-8
+#   key      raw bytes
+#   headers  <HH name length, value length, then the utf-8 name and the raw value, per header
+#   value    raw bytes, encoded with the codec of the topic
+_FRAME_HEADER = struct.Struct("<IHHB")
+_RECORD_HEADER = struct.Struct("<HH")
+
+
+def encode_frame(record: Record) -> bytes:
+    topic = record.topic.encode("utf-8")
+    headers = record.headers or []
+    parts = [_FRAME_HEADER.pack(len(record.value), len(topic), len(record.key), len(headers)), topic, record.key]
+    for name, value in headers:
+        encoded_name = name.encode("utf-8")
+        parts.append(_RECORD_HEADER.pack(len(encoded_name), len(value)))
+        parts.append(encoded_name)
+        parts.append(value)
+    parts.append(record.value)
+    return b"".join(parts)
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Record:
+    value_length, topic_length, key_length, header_count = _FRAME_HEADER.unpack(
+        await reader.readexactly(_FRAME_HEADER.size))
+    topic = (await reader.readexactly(topic_length)).decode("utf-8")
+    key = await reader.readexactly(key_length)
+    headers = []
+    for _ in range(header_count):
+        name_length, header_length = _RECORD_HEADER.unpack(await reader.readexactly(_RECORD_HEADER.size))
+        name = (await reader.readexactly(name_length)).decode("utf-8")
+        headers.append((name, await reader.readexactly(header_length)))
+    value = await reader.readexactly(value_length)
+    return Record(topic, key, value, headers or None)
+
+
+def default_socket_path() -> str:
+    # In a directory only the server's user can enter: the socket has no authentication and record keys are taken
+    # as user ids, so whoever can connect can act as any player.
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "npc_crawler", "npc_crawler.sock")
+    return os.path.join(tempfile.gettempdir(), f"npc_crawler-{os.getuid()}", "npc_crawler.sock")
+
+
+# Both sides of a transport on a Unix domain socket, for bots running on the same host. Every connected client can
+# send events and gets every update, like a consumer of the update topics; clients pick theirs by key. A client
+# whose unsent updates pile up past max_client_buffer bytes is disconnected rather than slowing the game down.
+class UnixSocketTransport(InboundTransport, OutboundTransport):
+    logger = logging.getLogger("transport.unix_socket")
+
+    def __init__(self, path: str, max_client_buffer: int = 8 * 1024 * 1024):
+        self._path = path
+        self._max_client_buffer = max_client_buffer
+        self._server: asyncio.AbstractServer | None = None
+        self._events: asyncio.Queue[Record] = asyncio.Queue()
+        self._clients: set[asyncio.StreamWriter] = set()
+
+    async def start(self):
+        if self._server is not None:
+            return
+        self._prepare_directory()
+        self._remove_stale_socket()
+        self._server = await asyncio.start_unix_server(self._serve_client, self._path)
+        os.chmod(self._path, 0o600)
+
+    async def receive(self, max_records: int, timeout_ms: int) -> list[Record]:
+        try:
+            records = [await asyncio.wait_for(self._events.get(), timeout_ms / 1000)]
+        except asyncio.TimeoutError:
+            return []
+        while len(records) < max_records and not self._events.empty():
+            records.append(self._events.get_nowait())
+        return records
+
+    async def send(self, record: Record):
+        frame = encode_frame(record)
+        for client in list(self._clients):
+            if client.transport.get_write_buffer_size() > self._max_client_buffer:
+                self.logger.warning("Disconnecting a client that does not keep up with the updates")
+                self._drop_client(client)
+                continue
+            client.write(frame)
+
+    async def flush(self):
+        clients = list(self._clients)
+        results = await asyncio.gather(*(client.drain() for client in clients), return_exceptions=True)
+        for client, result in zip(clients, results):
+            if isinstance(result, Exception):
+                self._drop_client(client)
+
+    async def close(self):
+        if self._server is None:
+            return
+        self._server.close()
+        for client in list(self._clients):
+            self._drop_client(client)
+        await self._server.wait_closed()
+        self._server = None
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._clients.add(writer)
+        try:
+            while True:
+                record = await read_frame(reader)
+                self._events.put_nowait(record._replace(timestamp=int(time.time() * 1000)))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._drop_client(writer)
+
+    def _prepare_directory(self):
+        directory = os.path.dirname(os.path.abspath(self._path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        info = os.stat(directory)
+        # Others may only write to a shared directory like /tmp when its sticky bit keeps them from replacing
+        # the socket.
+        shared = info.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+        if (info.st_uid != os.getuid() and not shared) or (shared and not info.st_mode & stat.S_ISVTX):
+            raise TransportError(f"{directory} must be owned by the server user or be a sticky shared directory")
+
+    def _remove_stale_socket(self):
+        try:
+            info = os.lstat(self._path)
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(info.st_mode):
+            raise TransportError(f"{self._path} exists and is not a socket")
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self._path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            # Left behind by a server that is gone.
+            os.unlink(self._path)
+            return
+        finally:
+            probe.close()
+        raise TransportError(f"Another server is listening on {self._path}")
+
+    def _drop_client(self, client: asyncio.StreamWriter):
+        if client in self._clients:
+            self._clients.discard(client)
+            client.close()
+
+
+# The bot side of UnixSocketTransport.
+class UnixSocketClient:
+    def __init__(self, path: str):
+        self._path = path
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.open_unix_connection(self._path)
+
+    async def send(self, record: Record):
+        self._writer.write(encode_frame(record))
+        await self._writer.drain()
+
+    async def receive(self) -> Record:
+        return await read_frame(self._reader)
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
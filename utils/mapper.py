@@ -1,3 +1,4 @@
+from game.item.registry import ITEM_TYPES, create_item
 from game.player import Player
 from models.models import CharStats, Character
 
@@ -9,7 +10,7 @@ def player_stats_to_stats_model(player: Player) -> CharStats:
         hungry=player.hungry,
         position_x=player.pos_x,
         position_y=player.pos_y,
-        inventory=player.inventory,
+        inventory=player_inventory_to_kinds(player),
         location_id=player.world.map_id,
         attack_modifier=player.attack_modifier,
         attack_damage=player.attack_damage,
@@ -18,6 +19,37 @@ def player_stats_to_stats_model(player: Player) -> CharStats:
     )
 
 
+def player_stats_to_stats_row(player: Player) -> dict:
+    # The CharStats columns of a bulk UPDATE by primary key. The location is left as it is for a player taken off
+    # the map.
+    row = {
+        "id": player.stats_id,
+        "health": player.health,
+        "energy": player.energy,
+        "hungry": player.hungry,
+        "position_x": player.pos_x,
+        "position_y": player.pos_y,
+        "inventory": player_inventory_to_kinds(player),
+        "attack_modifier": player.attack_modifier,
+        "attack_damage": player.attack_damage,
+        "defence": player.defence,
+        "is_dead": player.is_dead,
+    }
+    if player.world is not None:
+        row["location_id"] = player.world.map_id
+    return row
+
+
+def apply_stats_row(stats: CharStats, row: dict):
+    for column, value in row.items():
+        if column != "id":
+            setattr(stats, column, value)
+
+
+def player_inventory_to_kinds(player: Player) -> list[str]:
+    return [item.prototype.kind for item in player.inventory]
+
+
 def player_to_player_model(player: Player) -> Character:
     return Character(
         name=player.name,
@@ -28,13 +60,16 @@ def player_to_player_model(player: Player) -> Character:
 def character_model_to_player(character: Character) -> Player:
     player = Player(character.user_id, character.name)
     player.char_id = character.id
+    player.stats_id = character.stats_id
     player.health = character.stats.health
     player.pos_x = character.stats.position_x
     player.pos_y = character.stats.position_y
     player.energy = character.stats.energy
     player.hungry = character.stats.hungry
     player.direction = (0, -1)
-    player.inventory = character.stats.inventory
+    # The inventory is stored as item kinds; anything else is left out.
+    player.inventory = [create_item(kind) for kind in character.stats.inventory or []
+                        if isinstance(kind, str) and kind in ITEM_TYPES]
     player.is_dead = character.stats.is_dead
     player.defence = character.stats.defence
     player.attack_modifier = character.stats.attack_modifier